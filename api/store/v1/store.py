@@ -9,6 +9,7 @@ from reboot.api import (
     StateModel,
     Transaction,
     Type,
+    Workflow,
     Writer,
 )
 
@@ -23,11 +24,24 @@ class CartItem(BaseModel):
     price_cents: int = Field(tag=5)
     picture: str = Field(tag=6)
 
+class CartLine(BaseModel):
+    item: CartItem = Field(tag=1)
+    # Order in which the line was added, so `get_items` is stable.
+    position: int = Field(tag=2)
+
 class CartState(StateModel):
+    # Only set for carts written before `lines` existed; such carts are
+    # migrated to `lines` on their next mutation.
     items: Optional[list[CartItem]] = Field(tag=1)
+    # Lines keyed by product id.
+    lines: Optional[dict[str, CartLine]] = Field(tag=2)
+    next_position: Optional[int] = Field(tag=3)
 
 class AddItemRequest(BaseModel):
-    item: CartItem = Field(tag=1)
+    # The name, price and picture of the item are looked up from the
+    # catalog by the cart itself, which is the only catalog read.
+    product_id: str = Field(tag=2)
+    quantity: int = Field(tag=3)
 
 class GetItemsRequest(BaseModel):
     pass
@@ -48,6 +62,32 @@ class EmptyCartRequest(BaseModel):
 class CreateCartRequest(BaseModel):
     pass
 
+class CartOp(BaseModel):
+    # One of "add", "update" or "remove".
+    kind: str = Field(tag=1)
+    product_id: str = Field(tag=2)
+    # Added for "add" (default 1), set for "update", unused for "remove".
+    quantity: Optional[int] = Field(tag=3, default=None)
+
+class ApplyCartOpsRequest(BaseModel):
+    # Applied in order, all or nothing.
+    ops: list[CartOp] = Field(tag=1)
+
+class RefreshPricesRequest(BaseModel):
+    pass
+
+class PriceChange(BaseModel):
+    product_id: str = Field(tag=1)
+    old_price_cents: int = Field(tag=2)
+    new_price_cents: int = Field(tag=3)
+
+class RefreshPricesResponse(BaseModel):
+    # The cart's items with their refreshed names, prices and pictures.
+    items: list[CartItem] = Field(tag=1)
+    price_changes: list[PriceChange] = Field(tag=2)
+    # Products that are no longer in the catalog, and so were removed.
+    removed_ids: list[str] = Field(tag=3)
+
 CartMethods = Methods(
     add_item=Writer(
         request=AddItemRequest,
@@ -69,6 +109,14 @@ CartMethods = Methods(
         request=EmptyCartRequest,
         response=None,
     ),
+    apply_cart_ops=Writer(
+        request=ApplyCartOpsRequest,
+        response=None,
+    ),
+    refresh_prices=Writer(
+        request=RefreshPricesRequest,
+        response=RefreshPricesResponse,
+    ),
 )
 
 ########################################################################
@@ -82,16 +130,50 @@ class Product(BaseModel):
     picture: str = Field(tag=4)
     price_cents: int = Field(tag=5)
     categories: list[str] = Field(tag=6)
+    # The stock level as last set in the catalog; changing it restocks
+    # by the difference. Checkouts take stock from the product's
+    # `Inventory`, which has the stock actually available.
     stock_quantity: int = Field(tag=7)
+    # The catalog version at which the product last changed; set by the
+    # catalog, and used to detect conflicting updates.
+    version: Optional[int] = Field(tag=8, default=None)
 
 class ProductCatalogState(StateModel):
-    pass
+    # Incremented for every change to a product, each of which is
+    # recorded in the change log under the new version (which only keeps
+    # the most recent changes); lets caches tell whether what they hold
+    # is still current.
+    version: Optional[int] = Field(tag=1)
+
+class ProductChange(BaseModel):
+    version: int = Field(tag=1)
+    product_id: str = Field(tag=2)
+    # Either "upsert" or "remove".
+    kind: str = Field(tag=3)
+    # The product as of this change; unset for "remove".
+    product: Optional[Product] = Field(tag=4, default=None)
+
+# Just what's needed to show a product in a grid.
+class ProductSummary(BaseModel):
+    id: str = Field(tag=1)
+    name: str = Field(tag=2)
+    price_cents: int = Field(tag=3)
+    picture: str = Field(tag=4)
 
 class ListProductsRequest(BaseModel):
-    pass
+    start_key: Optional[str] = Field(tag=1, default=None)
+    page_size: Optional[int] = Field(tag=2, default=None)
+    # Either "full" (the default), which returns `products`, or
+    # "summary", which returns `summaries` instead.
+    view: Optional[str] = Field(tag=3, default=None)
 
 class ListProductsResponse(BaseModel):
     products: list[Product] = Field(tag=1)
+    next_cursor: Optional[str] = Field(tag=2, default=None)
+    summaries: Optional[list[ProductSummary]] = Field(tag=3, default=None)
+    # The catalog version this page was read at; pass it to
+    # `get_changes_since` to keep the page up to date.
+    version: Optional[int] = Field(tag=4, default=None)
 
 class GetProductRequest(BaseModel):
     product_id: str = Field(tag=1)
@@ -99,9 +181,115 @@ class GetProductRequest(BaseModel):
 class GetProductResponse(BaseModel):
     product: Product = Field(tag=1)
 
+class GetProductsRequest(BaseModel):
+    product_ids: list[str] = Field(tag=1)
+
+class GetProductsResponse(BaseModel):
+    # In the order they were asked for.
+    products: list[Product] = Field(tag=1)
+    missing_ids: list[str] = Field(tag=2)
+
 class AddProductRequest(BaseModel):
     product: Product = Field(tag=1)
 
+class AddProductsRequest(BaseModel):
+    products: list[Product] = Field(tag=1)
+
+class SearchProductsRequest(BaseModel):
+    query: str = Field(tag=1)
+    page_size: Optional[int] = Field(tag=2, default=None)
+    offset: Optional[int] = Field(tag=3, default=None)
+
+class SearchProductsResponse(BaseModel):
+    products: list[Product] = Field(tag=1)
+    total_hits: int = Field(tag=2)
+    next_offset: Optional[int] = Field(tag=3, default=None)
+
+class ListProductsByCategoryRequest(BaseModel):
+    category: str = Field(tag=1)
+    # The `next_cursor` of the previous page.
+    start_key: Optional[str] = Field(tag=2, default=None)
+    page_size: Optional[int] = Field(tag=3, default=None)
+    # Inclusive price bounds.
+    min_price_cents: Optional[int] = Field(tag=4, default=None)
+    max_price_cents: Optional[int] = Field(tag=5, default=None)
+
+class ListProductsByCategoryResponse(BaseModel):
+    # Cheapest first.
+    products: list[Product] = Field(tag=1)
+    # Opaque; unset if there are no more products.
+    next_cursor: Optional[str] = Field(tag=2, default=None)
+
+class GetChangesSinceRequest(BaseModel):
+    # Changes with a version greater than this are returned.
+    version: int = Field(tag=1)
+    limit: Optional[int] = Field(tag=2, default=None)
+
+class GetChangesSinceResponse(BaseModel):
+    # Oldest first.
+    changes: list[ProductChange] = Field(tag=1)
+    # The version the caller is current with once it has applied
+    # `changes`.
+    version: int = Field(tag=2)
+    # Whether there are more changes after `version`.
+    has_more: bool = Field(tag=3)
+    # Set if changes after the requested version are no longer in the
+    # change log; the caller must read the catalog again instead.
+    resync_required: bool = Field(tag=4, default=False)
+
+class ProductUpdate(BaseModel):
+    product_id: str = Field(tag=1)
+    # If set, the update is only applied if the product is still at this
+    # version, i.e., nobody else has changed it since it was read.
+    expected_version: Optional[int] = Field(tag=2, default=None)
+    # Only the fields that are set are updated; the rest are unchanged.
+    name: Optional[str] = Field(tag=3, default=None)
+    description: Optional[str] = Field(tag=4, default=None)
+    picture: Optional[str] = Field(tag=5, default=None)
+    price_cents: Optional[int] = Field(tag=6, default=None)
+    categories: Optional[list[str]] = Field(tag=7, default=None)
+    stock_quantity: Optional[int] = Field(tag=8, default=None)
+
+class UpdateProductRequest(BaseModel):
+    update: ProductUpdate = Field(tag=1)
+
+class UpdateProductResponse(BaseModel):
+    # The product as stored after the update.
+    product: Product = Field(tag=1)
+
+class UpdateProductsRequest(BaseModel):
+    updates: list[ProductUpdate] = Field(tag=1)
+
+class UpdateProductsResponse(BaseModel):
+    # Number of products that actually changed.
+    updated: int = Field(tag=1)
+    # Updates that were skipped because there is no such product, or
+    # because it has changed since `expected_version`.
+    missing_ids: list[str] = Field(tag=2)
+    conflicting_ids: list[str] = Field(tag=3)
+
+class RemoveProductRequest(BaseModel):
+    product_id: str = Field(tag=1)
+    expected_version: Optional[int] = Field(tag=2, default=None)
+
+class ReindexProductsRequest(BaseModel):
+    start_key: Optional[str] = Field(tag=1, default=None)
+    batch_size: Optional[int] = Field(tag=2, default=None)
+
+class ReindexProductsResponse(BaseModel):
+    reindexed: int = Field(tag=1)
+    # Where the next batch starts; unset once every product is indexed.
+    next_cursor: Optional[str] = Field(tag=2, default=None)
+
+class SeedInventoryRequest(BaseModel):
+    start_key: Optional[str] = Field(tag=1, default=None)
+    batch_size: Optional[int] = Field(tag=2, default=None)
+
+class SeedInventoryResponse(BaseModel):
+    seeded: int = Field(tag=1)
+    # Where the next batch starts; unset once every product is seeded.
+    next_cursor: Optional[str] = Field(tag=2, default=None)
+
 class CreateCatalogRequest(BaseModel):
     pass
 
@@ -114,10 +302,50 @@ ProductCatalogMethods = Methods(
         request=GetProductRequest,
         response=GetProductResponse,
     ),
+    get_products=Reader(
+        request=GetProductsRequest,
+        response=GetProductsResponse,
+    ),
     add_product=Transaction(
         request=AddProductRequest,
         response=None,
     ),
+    add_products=Transaction(
+        request=AddProductsRequest,
+        response=None,
+    ),
+    search_products=Reader(
+        request=SearchProductsRequest,
+        response=SearchProductsResponse,
+    ),
+    list_products_by_category=Reader(
+        request=ListProductsByCategoryRequest,
+        response=ListProductsByCategoryResponse,
+    ),
+    get_changes_since=Reader(
+        request=GetChangesSinceRequest,
+        response=GetChangesSinceResponse,
+    ),
+    update_product=Transaction(
+        request=UpdateProductRequest,
+        response=UpdateProductResponse,
+    ),
+    update_products=Transaction(
+        request=UpdateProductsRequest,
+        response=UpdateProductsResponse,
+    ),
+    remove_product=Transaction(
+        request=RemoveProductRequest,
+        response=None,
+    ),
+    reindex_products=Transaction(
+        request=ReindexProductsRequest,
+        response=ReindexProductsResponse,
+    ),
+    seed_inventory=Transaction(
+        request=SeedInventoryRequest,
+        response=SeedInventoryResponse,
+    ),
 )
 
 ########################################################################
@@ -142,18 +370,120 @@ class Order(BaseModel):
     carrier: str = Field(tag=8)
     created_at_time: int = Field(tag=9)
     shipping_address: Address = Field(tag=10)
+    # "paid" until the order has shipped (and `tracking_number` is set),
+    # then "shipped"; or "out_of_stock" if its stock was gone by the
+    # time it was paid for, in which case it was refunded. Orders
+    # placed before orders had a status have none, and were shipped
+    # when they were placed.
+    status: Optional[str] = Field(tag=11, default=None)
+
+class MonthlyOrderTotal(BaseModel):
+    order_count: int = Field(tag=1)
+    total_cents: int = Field(tag=2)
+
+class OrderSummary(BaseModel):
+    order_count: int = Field(tag=1)
+    total_cents: int = Field(tag=2)
+    # Keyed by the "YYYY-MM" (UTC) the orders were created in.
+    months: dict[str, MonthlyOrderTotal] = Field(tag=3)
+    # Milliseconds since the epoch.
+    last_order_time: Optional[int] = Field(tag=4, default=None)
+
+class OrderLine(BaseModel):
+    product_id: str = Field(tag=1)
+    quantity: int = Field(tag=2)
+    # What was paid per unit; the name and picture are looked up from
+    # the catalog when the order is read.
+    price_cents: int = Field(tag=3)
+
+class StoredOrder(BaseModel):
+    """How an `Order` is stored: its lines only reference products, and
+    its shipping address is interned in `OrdersState.addresses`.
+    """
+    order_id: str = Field(tag=1)
+    lines: list[OrderLine] = Field(tag=2)
+    transaction_id: str = Field(tag=3)
+    subtotal_cents: int = Field(tag=4)
+    shipping_cost_cents: int = Field(tag=5)
+    total_cents: int = Field(tag=6)
+    tracking_number: str = Field(tag=7)
+    carrier: str = Field(tag=8)
+    created_at_time: int = Field(tag=9)
+    address_id: str = Field(tag=10)
+    status: Optional[str] = Field(tag=11, default=None)
 
 class OrdersState(StateModel):
-    pass
+    # Running totals over every order, kept up to date by `add_order`.
+    # Users whose orders predate it have it computed on their next
+    # order.
+    summary: Optional[OrderSummary] = Field(tag=1)
+    # Every address this user has shipped to, keyed by a hash of it.
+    addresses: Optional[dict[str, Address]] = Field(tag=2)
 
 class AddOrderRequest(BaseModel):
     order: Order = Field(tag=1)
 
 class GetOrdersRequest(BaseModel):
-    pass
+    start_key: Optional[str] = Field(tag=1, default=None)
+    page_size: Optional[int] = Field(tag=2, default=None)
 
 class GetOrdersResponse(BaseModel):
     orders: list[Order] = Field(tag=1)
+    next_cursor: Optional[str] = Field(tag=2, default=None)
+
+class GetRecentOrdersRequest(BaseModel):
+    limit: Optional[int] = Field(tag=1, default=None)
+    # Only return orders created strictly before this time (in
+    # milliseconds since the epoch).
+    before: Optional[int] = Field(tag=2, default=None)
+    # The `next_cursor` of the previous page; only orders strictly
+    # older than it are returned. Takes precedence over `before`.
+    cursor: Optional[str] = Field(tag=3, default=None)
+
+class GetRecentOrdersResponse(BaseModel):
+    # Newest first.
+    orders: list[Order] = Field(tag=1)
+    # Opaque; unset if there are no older orders.
+    next_cursor: Optional[str] = Field(tag=3, default=None)
+
+class MigrateLegacyOrdersRequest(BaseModel):
+    batch_size: Optional[int] = Field(tag=1, default=None)
+
+class MigrateLegacyOrdersResponse(BaseModel):
+    migrated: int = Field(tag=1)
+    done: bool = Field(tag=2)
+
+class FulfillOrderRequest(BaseModel):
+    order_id: str = Field(tag=1)
+    items: list[CartItem] = Field(tag=2)
+    shipping_address: Address = Field(tag=3)
+    carrier: str = Field(tag=4)
+
+class MarkShippedRequest(BaseModel):
+    order_id: str = Field(tag=1)
+    tracking_number: str = Field(tag=2)
+    carrier: str = Field(tag=3)
+
+class GetOrderRequest(BaseModel):
+    order_id: str = Field(tag=1)
+
+class GetOrderResponse(BaseModel):
+    order: Order = Field(tag=1)
+
+class GetOrderStatusRequest(BaseModel):
+    order_id: str = Field(tag=1)
+
+class GetOrderStatusResponse(BaseModel):
+    status: str = Field(tag=1)
+    carrier: str = Field(tag=2)
+    # Set once the order has shipped.
+    tracking_number: Optional[str] = Field(tag=3, default=None)
+
+class GetOrderSummaryRequest(BaseModel):
+    pass
+
+class GetOrderSummaryResponse(BaseModel):
+    summary: OrderSummary = Field(tag=1)
 
 class CreateOrdersRequest(BaseModel):
     pass
@@ -166,7 +496,156 @@ OrdersMethods = Methods(
     get_orders=Reader(
         request=GetOrdersRequest,
         response=GetOrdersResponse,
-    )
+    ),
+    get_recent_orders=Reader(
+        request=GetRecentOrdersRequest,
+        response=GetRecentOrdersResponse,
+    ),
+    migrate_legacy_orders=Transaction(
+        request=MigrateLegacyOrdersRequest,
+        response=MigrateLegacyOrdersResponse,
+    ),
+    get_order_summary=Reader(
+        request=GetOrderSummaryRequest,
+        response=GetOrderSummaryResponse,
+    ),
+    # Ships a paid order in the background, once `checkout` has
+    # returned.
+    fulfill=Workflow(
+        request=FulfillOrderRequest,
+        response=None,
+    ),
+    mark_shipped=Transaction(
+        request=MarkShippedRequest,
+        response=None,
+    ),
+    get_order=Reader(
+        request=GetOrderRequest,
+        response=GetOrderResponse,
+    ),
+    get_order_status=Reader(
+        request=GetOrderStatusRequest,
+        response=GetOrderStatusResponse,
+    ),
+)
+
+########################################################################
+# Inventory
+########################################################################
+
+class StockHold(BaseModel):
+    quantity: int = Field(tag=1)
+    # Milliseconds since the epoch; after this the hold no longer counts
+    # against the available stock.
+    expires_at_time: int = Field(tag=2)
+
+class InventoryState(StateModel):
+    # Units in the warehouse, including those held by reservations.
+    on_hand: Optional[int] = Field(tag=1)
+    # Holds keyed by reservation id.
+    holds: Optional[dict[str, StockHold]] = Field(tag=2)
+
+class SetStockRequest(BaseModel):
+    quantity: int = Field(tag=1)
+
+class SeedStockRequest(BaseModel):
+    quantity: int = Field(tag=1)
+
+class AdjustStockRequest(BaseModel):
+    # Units to add (or, if negative, remove).
+    delta: int = Field(tag=1)
+    # The stock to start from if it has never been set.
+    initial_quantity: int = Field(tag=2)
+
+class GetStockRequest(BaseModel):
+    pass
+
+class GetStockResponse(BaseModel):
+    on_hand: int = Field(tag=1)
+    # `on_hand` less any unexpired holds.
+    available: int = Field(tag=2)
+
+class HoldStockRequest(BaseModel):
+    reservation_id: str = Field(tag=1)
+    quantity: int = Field(tag=2)
+    expires_at_time: int = Field(tag=3)
+
+class CommitStockRequest(BaseModel):
+    reservation_id: str = Field(tag=1)
+    # Needed in case the hold expired before it was committed.
+    quantity: int = Field(tag=2)
+
+class ReleaseStockRequest(BaseModel):
+    reservation_id: str = Field(tag=1)
+
+InventoryMethods = Methods(
+    set_stock=Writer(
+        request=SetStockRequest,
+        response=None,
+    ),
+    seed_stock=Writer(
+        request=SeedStockRequest,
+        response=None,
+    ),
+    adjust_stock=Writer(
+        request=AdjustStockRequest,
+        response=None,
+    ),
+    get_stock=Reader(
+        request=GetStockRequest,
+        response=GetStockResponse,
+    ),
+    reserve=Writer(
+        request=HoldStockRequest,
+        response=None,
+    ),
+    commit=Writer(
+        request=CommitStockRequest,
+        response=None,
+    ),
+    release=Writer(
+        request=ReleaseStockRequest,
+        response=None,
+    ),
+)
+
+########################################################################
+# Reservation
+########################################################################
+
+class ReservationLine(BaseModel):
+    product_id: str = Field(tag=1)
+    quantity: int = Field(tag=2)
+
+class ReservationState(StateModel):
+    lines: Optional[list[ReservationLine]] = Field(tag=1)
+    # One of "reserved", "committed" or "released".
+    status: Optional[str] = Field(tag=2)
+    expires_at_time: Optional[int] = Field(tag=3)
+
+class ReserveRequest(BaseModel):
+    lines: list[ReservationLine] = Field(tag=1)
+    ttl_seconds: Optional[int] = Field(tag=2, default=None)
+
+class CommitReservationRequest(BaseModel):
+    pass
+
+class ReleaseReservationRequest(BaseModel):
+    pass
+
+ReservationMethods = Methods(
+    reserve=Transaction(
+        request=ReserveRequest,
+        response=None,
+    ),
+    commit=Transaction(
+        request=CommitReservationRequest,
+        response=None,
+    ),
+    release=Transaction(
+        request=ReleaseReservationRequest,
+        response=None,
+    ),
 )
 
 ########################################################################
@@ -186,4 +665,12 @@ api = API(
         state=OrdersState,
         methods=OrdersMethods,
     ),
+    Inventory=Type(
+        state=InventoryState,
+        methods=InventoryMethods,
+    ),
+    Reservation=Type(
+        state=ReservationState,
+        methods=ReservationMethods,
+    ),
 )
@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+from backend.src import metrics
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+cache_hits = metrics.counter(
+    "cache_hits_total",
+    "Number of cache lookups that found a fresh entry, by cache.",
+)
+cache_misses = metrics.counter(
+    "cache_misses_total",
+    "Number of cache lookups that found no fresh entry, by cache.",
+)
+cache_evictions = metrics.counter(
+    "cache_evictions_total",
+    "Number of entries dropped because the cache was full or the entry "
+    "expired, by cache.",
+)
+
+
+class LRUCache(Generic[K, V]):
+    """An in-process least-recently-used cache whose entries also expire
+    `ttl_seconds` after they were stored.
+
+    Hits, misses and evictions are counted in `metrics` under the
+    `cache` label `name`.
+    """
+
+    def __init__(self, *, name: str, max_size: int, ttl_seconds: float):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+
+        if entry is not None:
+            stored_at, value = entry
+            if time.monotonic() - stored_at <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                cache_hits.inc(cache=self.name)
+                return value
+            del self._entries[key]
+            cache_evictions.inc(cache=self.name)
+
+        cache_misses.inc(cache=self.name)
+        return None
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            cache_evictions.inc(cache=self.name)
+
+    def invalidate(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
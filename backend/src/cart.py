@@ -1,4 +1,5 @@
 import time
+from typing import Optional
 from store.v1.store import (
     AddItemRequest,
     GetItemsRequest,
@@ -6,7 +7,14 @@ from store.v1.store import (
     UpdateItemQuantityRequest,
     RemoveItemRequest,
     EmptyCartRequest,
+    ApplyCartOpsRequest,
+    RefreshPricesRequest,
+    RefreshPricesResponse,
+    PriceChange,
+    GetProductsResponse,
     CartItem,
+    CartLine,
+    CartState,
     Product,
     CreateCartRequest,
 )
@@ -14,9 +22,62 @@ from store.v1.store_rbt import Cart, ProductCatalog
 from reboot.aio.auth.authorizers import allow
 from reboot.aio.contexts import ReaderContext, WriterContext
 from constants import PRODUCT_CATALOG_ID
-from rbt.v1alpha1.errors_pb2 import NotFound
+from rbt.v1alpha1.errors_pb2 import InvalidArgument, NotFound
+from backend.src import instrumentation, metrics
+from backend.src.product import MAX_GET_PRODUCTS
 
+add_item_calls = metrics.counter(
+    "cart_add_item_total",
+    "Number of `Cart.add_item` calls.",
+)
+
+# Together with `cart_add_item_total` this shows that adding an item
+# costs at most one catalog read.
+catalog_reads = metrics.counter(
+    "catalog_reads_total",
+    "Number of `ProductCatalog` reads, by caller.",
+)
+
+# Kinds of `CartOp`.
+ADD = "add"
+UPDATE = "update"
+REMOVE = "remove"
+
+
+def cart_lines(state: CartState) -> dict[str, CartLine]:
+    """Returns the lines of the cart keyed by product id.
+
+    Carts written before lines were indexed store a plain `items` list;
+    it is moved into `lines` the first time it is needed.
+    """
+    if state.lines is None:
+        state.lines = {}
+        state.next_position = 0
+
+    if state.items:
+        for item in state.items:
+            add_line(state, item)
+        state.items = None
+
+    return state.lines
 
+
+def add_line(state: CartState, item: CartItem) -> None:
+    """Adds `item` as the last line of the cart."""
+    position = state.next_position or 0
+    state.lines[item.product_id] = CartLine(item=item, position=position)
+    state.next_position = position + 1
+
+
+def ordered_items(state: CartState) -> list[CartItem]:
+    """Returns the items of the cart in the order they were added."""
+    if state.lines is None:
+        return list(state.items or [])
+    lines = sorted(state.lines.values(), key=lambda line: line.position)
+    return [line.item for line in lines]
+
+
+@instrumentation.servicer
 class CartServicer(Cart.Servicer):
 
     def authorizer(self):
@@ -27,74 +88,231 @@ class CartServicer(Cart.Servicer):
         context: WriterContext,
         request: AddItemRequest,
     ) -> None:
+        add_item_calls.inc()
 
-        catalog = ProductCatalog.ref(PRODUCT_CATALOG_ID)
+        lines = cart_lines(self.state)
 
-        try:
-            product_response = await catalog.get_product(
-                context,
-                product_id=request.item.product_id,
-            )
-            product = product_response.product
-        except Exception as e:
+        # Items already in the cart only need their quantity bumped, so
+        # there's no need to read the catalog for them.
+        line = lines.get(request.product_id)
+        if line is not None:
+            line.item.quantity += request.quantity
+            return
+
+        product = await self._read_product(
+            context,
+            request.product_id,
+            caller="cart.add_item",
+        )
+        if product is None:
             raise Cart.AddItemAborted(
                 NotFound(),
-                message=f"Product not found: {request.item.product_id}"
+                message=f"Product not found: {request.product_id}"
             )
 
-        if (not self.state.items):
-            self.state.items = []
-
-        for existing_item in self.state.items:
-            if existing_item.product_id == request.item.product_id:
-                existing_item.quantity += request.item.quantity
-                return
-
-        new_item = CartItem(
-            product_id=request.item.product_id,
-            quantity=request.item.quantity,
-            name=product.name,
-            price_cents=product.price_cents,
-            picture=product.picture,
-        )
-        self.state.items.append(new_item)
+        add_line(self.state, _new_item(product, request.quantity))
 
     async def get_items(
         self,
         context: ReaderContext,
         request: GetItemsRequest,
     ) -> GetItemsResponse:
-        return GetItemsResponse(items=self.state.items or [])
+        return GetItemsResponse(items=ordered_items(self.state))
 
     async def update_item_quantity(
         self,
         context: WriterContext,
         request: UpdateItemQuantityRequest,
     ) -> None:
-        if (not self.state.items):
-            self.state.items = []
-
-        for item in self.state.items:
-            if item.product_id == request.product_id:
-                item.quantity = request.quantity
-                break
+        line = cart_lines(self.state).get(request.product_id)
+        if line is not None:
+            line.item.quantity = request.quantity
 
     async def remove_item(
         self,
         context: WriterContext,
         request: RemoveItemRequest,
     ) -> None:
-        if (not self.state.items):
-            return
-
-        for i, item in enumerate(self.state.items):
-            if item.product_id == request.product_id:
-                del self.state.items[i]
-                break
+        cart_lines(self.state).pop(request.product_id, None)
 
     async def empty_cart(
         self,
         context: WriterContext,
         request: EmptyCartRequest,
     ) -> None:
-        self.state.items = []
+        self.state.items = None
+        self.state.lines = {}
+        self.state.next_position = 0
+
+    async def apply_cart_ops(
+        self,
+        context: WriterContext,
+        request: ApplyCartOpsRequest,
+    ) -> None:
+        for op in request.ops:
+            if op.kind not in (ADD, UPDATE, REMOVE):
+                raise Cart.ApplyCartOpsAborted(
+                    InvalidArgument(),
+                    message=f"Unknown cart op: {op.kind}"
+                )
+            if op.kind == UPDATE and op.quantity is None:
+                raise Cart.ApplyCartOpsAborted(
+                    InvalidArgument(),
+                    message=f"Missing quantity to update {op.product_id} to"
+                )
+
+        lines = cart_lines(self.state)
+
+        # Read every product we need up front, in a single catalog call, so
+        # that nothing is changed unless all of the ops can be applied.
+        to_read: dict[str, None] = {}
+        in_cart = set(lines)
+        for op in request.ops:
+            if op.kind == ADD and op.product_id not in in_cart:
+                to_read[op.product_id] = None
+                in_cart.add(op.product_id)
+            elif op.kind == REMOVE:
+                in_cart.discard(op.product_id)
+
+        response = await self._read_products(
+            context,
+            list(to_read),
+            caller="cart.apply_cart_ops",
+        )
+        if len(response.missing_ids) > 0:
+            raise Cart.ApplyCartOpsAborted(
+                NotFound(),
+                message=f"Product not found: {response.missing_ids[0]}"
+            )
+        products_by_id = {product.id: product for product in response.products}
+
+        for op in request.ops:
+            line = lines.get(op.product_id)
+            if op.kind == ADD:
+                quantity = op.quantity if op.quantity is not None else 1
+                if line is not None:
+                    line.item.quantity += quantity
+                else:
+                    add_line(
+                        self.state,
+                        _new_item(products_by_id[op.product_id], quantity),
+                    )
+            elif op.kind == UPDATE:
+                if line is not None:
+                    line.item.quantity = op.quantity
+            else:
+                lines.pop(op.product_id, None)
+
+    async def refresh_prices(
+        self,
+        context: WriterContext,
+        request: RefreshPricesRequest,
+    ) -> RefreshPricesResponse:
+        """Brings the name, price and picture of every item up to date
+        with the catalog, with a single catalog read, and reports which
+        prices changed since the items were added.
+        """
+        lines = cart_lines(self.state)
+
+        if len(lines) == 0:
+            return RefreshPricesResponse(
+                items=[],
+                price_changes=[],
+                removed_ids=[],
+            )
+
+        response = await self._read_products(
+            context,
+            list(lines),
+            caller="cart.refresh_prices",
+        )
+
+        price_changes: list[PriceChange] = []
+        for product in response.products:
+            item = lines[product.id].item
+            if item.price_cents != product.price_cents:
+                price_changes.append(
+                    PriceChange(
+                        product_id=product.id,
+                        old_price_cents=item.price_cents,
+                        new_price_cents=product.price_cents,
+                    )
+                )
+            item.name = product.name
+            item.price_cents = product.price_cents
+            item.picture = product.picture
+
+        # Products that have been removed from the catalog can't be
+        # bought anymore.
+        for product_id in response.missing_ids:
+            lines.pop(product_id, None)
+
+        return RefreshPricesResponse(
+            items=ordered_items(self.state),
+            price_changes=price_changes,
+            removed_ids=response.missing_ids,
+        )
+
+    async def _read_product(
+        self,
+        context: WriterContext,
+        product_id: str,
+        *,
+        caller: str,
+    ) -> Optional[Product]:
+        """Reads `product_id` from the catalog, or returns `None` if it
+        can't be found.
+        """
+        catalog_reads.inc(caller=caller)
+
+        try:
+            response = await ProductCatalog.ref(
+                PRODUCT_CATALOG_ID
+            ).get_product(
+                context,
+                product_id=product_id,
+            )
+        except ProductCatalog.GetProductAborted:
+            return None
+
+        return response.product
+
+    async def _read_products(
+        self,
+        context: WriterContext,
+        product_ids: list[str],
+        *,
+        caller: str,
+    ) -> GetProductsResponse:
+        """Reads `product_ids` from the catalog in as few calls as
+        `get_products` allows.
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        products: list[Product] = []
+        missing_ids: list[str] = []
+
+        for start in range(0, len(product_ids), MAX_GET_PRODUCTS):
+            catalog_reads.inc(caller=caller)
+            response = await ProductCatalog.ref(
+                PRODUCT_CATALOG_ID
+            ).get_products(
+                context,
+                product_ids=product_ids[start:start + MAX_GET_PRODUCTS],
+            )
+            products.extend(response.products)
+            missing_ids.extend(response.missing_ids)
+
+        return GetProductsResponse(
+            products=products,
+            missing_ids=missing_ids,
+        )
+
+
+def _new_item(product: Product, quantity: int) -> CartItem:
+    return CartItem(
+        product_id=product.id,
+        quantity=quantity,
+        name=product.name,
+        price_cents=product.price_cents,
+        picture=product.picture,
+    )
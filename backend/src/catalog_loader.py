@@ -0,0 +1,256 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, Iterator, TypeVar
+from store.v1.store import Product, ProductUpdate
+from store.v1.store_rbt import ProductCatalog
+from reboot.aio.external import ExternalContext
+from constants import PRODUCT_CATALOG_ID
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 100
+DEFAULT_CONCURRENCY = 4
+
+# Categories are stored in a single CSV column, separated by this.
+CSV_CATEGORY_SEPARATOR = "|"
+
+T = TypeVar("T")
+
+
+@dataclass(kw_only=True)
+class LoadStats:
+    products: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    # Only set when applying updates.
+    updated: int = 0
+    missing_ids: int = 0
+    conflicting_ids: int = 0
+
+    @property
+    def products_per_second(self) -> float:
+        return self.products / self.seconds if self.seconds > 0 else 0.0
+
+
+def read_feed(path: Path) -> Iterator[Product]:
+    """Lazily reads products from a JSONL or CSV feed.
+
+    JSONL feeds have one `Product` object per line. CSV feeds have a
+    header row naming the `Product` fields, with `categories` joined by
+    `CSV_CATEGORY_SEPARATOR`.
+    """
+    with path.open(newline="") as feed:
+        if path.suffix == ".csv":
+            for row in csv.DictReader(feed):
+                yield Product(
+                    id=row["id"],
+                    name=row["name"],
+                    description=row["description"],
+                    picture=row["picture"],
+                    price_cents=int(row["price_cents"]),
+                    categories=[
+                        category
+                        for category in row["categories"].split(
+                            CSV_CATEGORY_SEPARATOR
+                        ) if category
+                    ],
+                    stock_quantity=int(row["stock_quantity"]),
+                )
+        else:
+            for line in feed:
+                if line.strip():
+                    yield Product(**json.loads(line))
+
+
+def read_updates(path: Path) -> Iterator[ProductUpdate]:
+    """Lazily reads a JSONL feed of `ProductUpdate` objects, e.g., a
+    nightly price feed of `{"product_id": ..., "price_cents": ...}`.
+    """
+    with path.open() as feed:
+        for line in feed:
+            if line.strip():
+                yield ProductUpdate(**json.loads(line))
+
+
+async def load_products(
+    context: ExternalContext,
+    products: Iterable[Product],
+    *,
+    idempotency_prefix: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> LoadStats:
+    """Adds `products` to the catalog in chunks of `chunk_size`, with at
+    most `concurrency` `add_products` transactions in flight.
+
+    `products` is consumed lazily, so arbitrarily large feeds can be
+    streamed without holding them in memory. Each chunk is added
+    idempotently (keyed by `idempotency_prefix` and the chunk's index),
+    so a load that is interrupted can safely be retried.
+    """
+    catalog = ProductCatalog.ref(PRODUCT_CATALOG_ID)
+    stats = LoadStats()
+
+    async def add_chunk(index: int, chunk: list[Product]) -> None:
+        await catalog.idempotently(
+            f"{idempotency_prefix}-{index}"
+        ).add_products(context, products=chunk)
+
+    await _send_in_chunks(
+        products,
+        add_chunk,
+        stats=stats,
+        chunk_size=chunk_size,
+        concurrency=concurrency,
+    )
+    return stats
+
+
+async def update_products(
+    context: ExternalContext,
+    updates: Iterable[ProductUpdate],
+    *,
+    idempotency_prefix: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> LoadStats:
+    """Applies `updates` to the catalog like `load_products` adds
+    products, but only rewriting the fields that each update sets.
+    """
+    catalog = ProductCatalog.ref(PRODUCT_CATALOG_ID)
+    stats = LoadStats()
+
+    async def update_chunk(index: int, chunk: list[ProductUpdate]) -> None:
+        response = await catalog.idempotently(
+            f"{idempotency_prefix}-{index}"
+        ).update_products(context, updates=chunk)
+        stats.updated += response.updated
+        stats.missing_ids += len(response.missing_ids)
+        stats.conflicting_ids += len(response.conflicting_ids)
+
+    await _send_in_chunks(
+        updates,
+        update_chunk,
+        stats=stats,
+        chunk_size=chunk_size,
+        concurrency=concurrency,
+    )
+    return stats
+
+
+async def _send_in_chunks(
+    items: Iterable[T],
+    send: Callable[[int, list[T]], Awaitable[None]],
+    *,
+    stats: LoadStats,
+    chunk_size: int,
+    concurrency: int,
+) -> None:
+    """Calls `send` with each chunk of `items` and its index, with at
+    most `concurrency` calls in flight.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    async def send_chunk(index: int, chunk: list[T]) -> None:
+        try:
+            await send(index, chunk)
+        finally:
+            semaphore.release()
+
+        stats.products += len(chunk)
+        stats.chunks += 1
+        stats.seconds = time.perf_counter() - start
+        logger.info(
+            "Loaded %d products (%.0f products/s)",
+            stats.products,
+            stats.products_per_second,
+        )
+
+    async with asyncio.TaskGroup() as tasks:
+        chunk: list[T] = []
+        index = 0
+        for item in items:
+            chunk.append(item)
+            if len(chunk) == chunk_size:
+                # Wait for a free slot before reading any further, so
+                # that a slow catalog applies backpressure to the feed.
+                await semaphore.acquire()
+                tasks.create_task(send_chunk(index, chunk))
+                chunk = []
+                index += 1
+        if len(chunk) > 0:
+            await semaphore.acquire()
+            tasks.create_task(send_chunk(index, chunk))
+
+    stats.seconds = time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Load a JSONL or CSV product feed into the catalog."
+    )
+    parser.add_argument("feed", type=Path)
+    parser.add_argument(
+        "--updates",
+        action="store_true",
+        help="Treat the feed as JSONL `ProductUpdate`s (e.g., prices).",
+    )
+    parser.add_argument("--url", default="http://localhost:9991")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    context = ExternalContext(name="catalog-loader", url=args.url)
+
+    # Reloading the same, unchanged feed is a no-op, but a modified
+    # feed is loaded again.
+    feed_stat = os.stat(args.feed)
+    idempotency_prefix = (
+        f"load-{args.feed.name}-{feed_stat.st_size}-{feed_stat.st_mtime_ns}"
+    )
+
+    if args.updates:
+        stats = await update_products(
+            context,
+            read_updates(args.feed),
+            idempotency_prefix=f"update-{idempotency_prefix}",
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency,
+        )
+    else:
+        stats = await load_products(
+            context,
+            read_feed(args.feed),
+            idempotency_prefix=idempotency_prefix,
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency,
+        )
+
+    print(
+        f"Loaded {stats.products} products in {stats.chunks} chunks "
+        f"in {stats.seconds:.2f}s ({stats.products_per_second:.0f} "
+        f"products/s)"
+    )
+    if args.updates:
+        print(
+            f"Updated {stats.updated}, {stats.missing_ids} missing, "
+            f"{stats.conflicting_ids} conflicting"
+        )
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
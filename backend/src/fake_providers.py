@@ -0,0 +1,130 @@
+"""A local stand-in for real shipping and payment providers.
+
+Serves the same responses as the in-process mocks over HTTP, optionally
+with added latency and failures, so that checkout can be exercised
+against `ProviderClient`s without a real provider. Run with:
+
+    PYTHONPATH=api python -m backend.src.fake_providers --port 8181
+
+and point checkout at it with `SHIPPING_PROVIDER_URL` and
+`PAYMENT_PROVIDER_URL` set to `http://127.0.0.1:8181`.
+"""
+import argparse
+import asyncio
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from backend.src.providers import MockPaymentProvider, MockShippingProvider
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8181
+
+
+def create_app(
+    *,
+    latency_ms: float = 0.0,
+    failure_rate: float = 0.0,
+) -> Starlette:
+    """Returns the fake providers' app. Each request takes `latency_ms`
+    and fails with a 503 with probability `failure_rate`.
+    """
+    shipping = MockShippingProvider()
+    payment = MockPaymentProvider()
+
+    async def respond(result) -> JSONResponse:
+        if latency_ms > 0:
+            await asyncio.sleep(latency_ms / 1000)
+        if random.random() < failure_rate:
+            return JSONResponse({"error": "unavailable"}, status_code=503)
+        return JSONResponse(await result)
+
+    async def quote(request: Request) -> JSONResponse:
+        body = await request.json()
+        return await respond(
+            shipping.quote(body["weight_pounds"], body["address"])
+        )
+
+    async def ship(request: Request) -> JSONResponse:
+        body = await request.json()
+        return await respond(
+            shipping.ship(body["items"], body["address"], body["carrier"])
+        )
+
+    async def charge(request: Request) -> JSONResponse:
+        body = await request.json()
+        return await respond(
+            payment.charge(body["card"], body["amount_cents"])
+        )
+
+    async def refund(request: Request) -> JSONResponse:
+        body = await request.json()
+        return await respond(
+            payment.refund(body["transaction_id"], body["amount_cents"])
+        )
+
+    return Starlette(
+        routes=[
+            Route("/quote", quote, methods=["POST"]),
+            Route("/ship", ship, methods=["POST"]),
+            Route("/charge", charge, methods=["POST"]),
+            Route("/refund", refund, methods=["POST"]),
+        ],
+    )
+
+
+@asynccontextmanager
+async def running_fake_providers(
+    *,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    latency_ms: float = 0.0,
+    failure_rate: float = 0.0,
+) -> AsyncIterator[str]:
+    """Serves the fake providers in this process, yielding their URL."""
+    server = uvicorn.Server(
+        uvicorn.Config(
+            create_app(latency_ms=latency_ms, failure_rate=failure_rate),
+            host=host,
+            port=port,
+            log_level="warning",
+        )
+    )
+    serving = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            if serving.done():
+                # Surface why the server didn't start (e.g., the port
+                # is taken).
+                await serving
+            await asyncio.sleep(0.01)
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(
+            latency_ms=args.latency_ms,
+            failure_rate=args.failure_rate,
+        ),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == '__main__':
+    main()
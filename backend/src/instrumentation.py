@@ -0,0 +1,148 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Awaitable, Callable, ContextManager, Iterator, TypeVar
+from reboot.aio import workflows
+from reboot.aio.contexts import WorkflowContext
+from backend.src import metrics
+
+try:
+    # OpenTelemetry is optional; without it we only record metrics.
+    from opentelemetry import trace
+    _tracer: Any = trace.get_tracer("durable-mcp-store")
+except ImportError:
+    _tracer = None
+
+T = TypeVar("T")
+F = TypeVar("F", bound=Callable[..., Any])
+S = TypeVar("S", bound=type)
+
+calls = metrics.counter(
+    "calls_total",
+    "Number of calls to MCP tools and servicer methods, by kind and "
+    "name.",
+)
+errors = metrics.counter(
+    "call_errors_total",
+    "Number of calls to MCP tools and servicer methods that raised, by "
+    "kind and name.",
+)
+call_seconds = metrics.histogram(
+    "call_seconds",
+    "How long calls to MCP tools and servicer methods take, by kind and "
+    "name.",
+)
+step_seconds = metrics.histogram(
+    "at_least_once_seconds",
+    "How long `at_least_once` steps take, by step and by whether the "
+    "step was executed or its memoized result replayed.",
+)
+
+
+def span(name: str, **attributes: Any) -> ContextManager[Any]:
+    """Returns an OpenTelemetry span called `name` if OpenTelemetry is
+    installed, and a no-op otherwise.
+    """
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+@contextmanager
+def _observed(kind: str, name: str) -> Iterator[None]:
+    calls.inc(kind=kind, name=name)
+    start = time.perf_counter()
+    try:
+        with span(name, kind=kind):
+            yield
+    except BaseException:
+        errors.inc(kind=kind, name=name)
+        raise
+    finally:
+        call_seconds.observe(
+            time.perf_counter() - start,
+            kind=kind,
+            name=name,
+        )
+
+
+def tool(fn: F) -> F:
+    """Instruments an MCP tool; apply it beneath `@mcp.tool()`.
+
+    Note that in development, where effect validation re-runs every
+    tool, each call is counted twice.
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with _observed("tool", fn.__name__):
+            result = fn(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+
+    return wrapper  # type: ignore[return-value]
+
+
+def servicer(cls: S) -> S:
+    """Instruments every public method a servicer class defines.
+
+    Methods are named `{Type}.{method}`, e.g., `Cart.add_item` for
+    `CartServicer.add_item`.
+    """
+    type_name = cls.__name__.removesuffix("Servicer")
+
+    for attribute, method in list(vars(cls).items()):
+        if attribute.startswith("_") or attribute == "authorizer":
+            continue
+        if not inspect.iscoroutinefunction(method):
+            continue
+        setattr(cls, attribute, _instrument_method(type_name, method))
+
+    return cls
+
+
+def _instrument_method(type_name: str, method: F) -> F:
+    name = f"{type_name}.{method.__name__}"
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        with _observed("method", name):
+            return await method(*args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
+
+
+async def at_least_once(
+    alias: str,
+    context: WorkflowContext,
+    callable: Callable[[], Awaitable[T]],
+    *,
+    type: type = type(None),
+) -> T:
+    """Like `reboot.aio.workflows.at_least_once`, but also records how
+    long the step takes, telling apart a first execution (including any
+    retries) from a replay of its memoized result.
+    """
+    executed = False
+
+    async def execute() -> T:
+        nonlocal executed
+        executed = True
+        return await callable()
+
+    start = time.perf_counter()
+    with span(alias, kind="at_least_once"):
+        result = await workflows.at_least_once(
+            alias,
+            context,
+            execute,
+            type=type,
+        )
+    step_seconds.observe(
+        time.perf_counter() - start,
+        step=alias,
+        execution="first" if executed else "replay",
+    )
+    return result
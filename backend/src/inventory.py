@@ -0,0 +1,149 @@
+import time
+from store.v1.store import (
+    SetStockRequest,
+    SeedStockRequest,
+    AdjustStockRequest,
+    GetStockRequest,
+    GetStockResponse,
+    HoldStockRequest,
+    CommitStockRequest,
+    ReleaseStockRequest,
+    StockHold,
+)
+from store.v1.store_rbt import Inventory
+from reboot.aio.auth.authorizers import allow
+from reboot.aio.contexts import ReaderContext, WriterContext
+from rbt.v1alpha1.errors_pb2 import FailedPrecondition
+from backend.src import instrumentation
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+@instrumentation.servicer
+class InventoryServicer(Inventory.Servicer):
+    """Stock of a single product, keyed by product id.
+
+    Keeping each SKU in its own state means that checkouts only contend
+    with other checkouts of the same products, never with the catalog.
+    """
+
+    def authorizer(self):
+        return allow()
+
+    async def set_stock(
+        self,
+        context: WriterContext,
+        request: SetStockRequest,
+    ) -> None:
+        self.state.on_hand = request.quantity
+
+    async def seed_stock(
+        self,
+        context: WriterContext,
+        request: SeedStockRequest,
+    ) -> None:
+        """Sets the stock only if it has never been set, so that stock
+        already taken by checkouts isn't reset.
+        """
+        if self.state.on_hand is None:
+            self.state.on_hand = request.quantity
+
+    async def adjust_stock(
+        self,
+        context: WriterContext,
+        request: AdjustStockRequest,
+    ) -> None:
+        """Adds `delta` units to the stock, so that units already sold
+        stay sold; the stock never goes below zero.
+        """
+        on_hand = self.state.on_hand
+        if on_hand is None:
+            on_hand = request.initial_quantity
+        self.state.on_hand = max(on_hand + request.delta, 0)
+
+    async def get_stock(
+        self,
+        context: ReaderContext,
+        request: GetStockRequest,
+    ) -> GetStockResponse:
+        on_hand = self.state.on_hand or 0
+        return GetStockResponse(
+            on_hand=on_hand,
+            available=on_hand - _held(self.state.holds or {}),
+        )
+
+    async def reserve(
+        self,
+        context: WriterContext,
+        request: HoldStockRequest,
+    ) -> None:
+        holds = self._live_holds()
+
+        if request.reservation_id in holds:
+            return
+
+        available = (self.state.on_hand or 0) - _held(holds)
+        if available < request.quantity:
+            raise Inventory.ReserveAborted(
+                FailedPrecondition(),
+                message=(
+                    f"Only {max(available, 0)} of "
+                    f"{self.ref().state_id} left in stock"
+                ),
+            )
+
+        holds[request.reservation_id] = StockHold(
+            quantity=request.quantity,
+            expires_at_time=request.expires_at_time,
+        )
+
+    async def commit(
+        self,
+        context: WriterContext,
+        request: CommitStockRequest,
+    ) -> None:
+        holds = self._live_holds()
+
+        # If the hold expired (or was released) we can still commit, as
+        # long as nobody else has taken the stock in the meantime.
+        if holds.pop(request.reservation_id, None) is None:
+            available = (self.state.on_hand or 0) - _held(holds)
+            if available < request.quantity:
+                raise Inventory.CommitAborted(
+                    FailedPrecondition(),
+                    message=(
+                        f"Reservation {request.reservation_id} is no "
+                        f"longer held and {self.ref().state_id} is out of "
+                        "stock"
+                    ),
+                )
+
+        self.state.on_hand = (self.state.on_hand or 0) - request.quantity
+
+    async def release(
+        self,
+        context: WriterContext,
+        request: ReleaseStockRequest,
+    ) -> None:
+        self._live_holds().pop(request.reservation_id, None)
+
+    def _live_holds(self) -> dict[str, StockHold]:
+        """Returns the unexpired holds, dropping any that have expired."""
+        now = now_ms()
+        self.state.holds = {
+            reservation_id: hold
+            for reservation_id, hold in (self.state.holds or {}).items()
+            if hold.expires_at_time > now
+        }
+        return self.state.holds
+
+
+def _held(holds: dict[str, StockHold]) -> int:
+    now = now_ms()
+    return sum(
+        hold.quantity
+        for hold in holds.values()
+        if hold.expires_at_time > now
+    )
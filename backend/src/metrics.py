@@ -0,0 +1,149 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Union
+
+LabelValues = tuple[tuple[str, str], ...]
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+        ]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+# Upper bounds, in seconds, suited to timing calls to other services.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, optionally split by
+    labels.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: the count in each bucket (plus one for
+        # `+Inf`), and the sum of all observations.
+        self._values: dict[LabelValues, tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        counts, total = self._values.get(
+            key, ([0] * (len(self.buckets) + 1), 0.0)
+        )
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes how many seconds the `with` block takes."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(tuple(sorted(labels.items())))
+        return sum(entry[0]) if entry is not None else 0
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                bucket_labels = _format_labels(labels + (("le", bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(
+                f"{self.name}_count{_format_labels(labels)} {cumulative}"
+            )
+        return lines
+
+
+Metric = Union[Counter, Histogram]
+
+_metrics: dict[str, Metric] = {}
+
+
+def counter(name: str, help: str) -> Counter:
+    """Returns the counter called `name`, creating it if necessary."""
+    metric: Optional[Metric] = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = Counter(name, help)
+    assert isinstance(metric, Counter)
+    return metric
+
+
+def histogram(
+    name: str,
+    help: str,
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    """Returns the histogram called `name`, creating it if necessary."""
+    metric: Optional[Metric] = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = Histogram(name, help, buckets)
+    assert isinstance(metric, Histogram)
+    return metric
+
+
+def render() -> str:
+    """Renders every metric in the Prometheus text exposition format.
+
+    Metrics are kept per process, so this only reports what this
+    process has served.
+    """
+    lines: list[str] = []
+    for name in sorted(_metrics):
+        lines.extend(_metrics[name].render())
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: LabelValues) -> str:
+    if len(labels) == 0:
+        return ""
+    formatted = ",".join(
+        f'{name}="{_escape(value)}"' for name, value in labels
+    )
+    return "{" + formatted + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace(
+        '"', '\\"'
+    )
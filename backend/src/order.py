@@ -1,19 +1,215 @@
+import hashlib
 import time
+import uuid
+import uuid7
+from typing import Optional, Union
+from google.protobuf.struct_pb2 import Value
 from store.v1.store import (
     GetOrdersRequest,
     GetOrdersResponse,
+    GetRecentOrdersRequest,
+    GetRecentOrdersResponse,
     AddOrderRequest,
+    MigrateLegacyOrdersRequest,
+    MigrateLegacyOrdersResponse,
+    GetOrderSummaryRequest,
+    GetOrderSummaryResponse,
+    FulfillOrderRequest,
+    MarkShippedRequest,
+    GetOrderRequest,
+    GetOrderResponse,
+    GetOrderStatusRequest,
+    GetOrderStatusResponse,
     CreateOrdersRequest,
+    Address,
+    CartItem,
+    MonthlyOrderTotal,
     Order,
+    OrderLine,
+    OrderSummary,
+    Product,
+    StoredOrder,
 )
-from store.v1.store_rbt import Orders
+from store.v1.store_rbt import Orders, ProductCatalog
 from reboot.aio.auth.authorizers import allow
-from reboot.aio.contexts import ReaderContext, WriterContext
+from reboot.aio.contexts import (
+    ReaderContext,
+    TransactionContext,
+    WorkflowContext,
+    WriterContext,
+)
 from reboot.std.collections.ordered_map.v1.ordered_map import OrderedMap
 from reboot.protobuf import from_model, as_model
-from constants import ORDERS_ID
+from rbt.v1alpha1.errors_pb2 import NotFound, StateNotConstructed
+from backend.src.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    read_page,
+)
+from backend.src.product import MAX_GET_PRODUCTS
+from backend.src import instrumentation, providers
+from constants import LEGACY_ORDERS_ID, PRODUCT_CATALOG_ID
+
+DEFAULT_MIGRATION_BATCH_SIZE = 100
+
+# Values of `Order.status`.
+PAID = "paid"
+SHIPPED = "shipped"
+# Paid for, but its stock was gone by the time it was committed; it is
+# never shipped, and its payment is refunded.
+OUT_OF_STOCK = "out_of_stock"
+
+
+def order_time_prefix(timestamp_ms: int) -> str:
+    """Returns the prefix shared by every UUIDv7 order id created at
+    `timestamp_ms`.
+
+    Order ids are UUIDv7s, whose first 48 bits are the creation time,
+    so every id created before `timestamp_ms` sorts before this prefix.
+    """
+    digits = f"{timestamp_ms:012x}"
+    return f"{digits[:8]}-{digits[8:]}"
+
+
+def _is_time_ordered(order_id: str) -> bool:
+    try:
+        uuid7.time(order_id)
+    except ValueError:
+        return False
+    return True
+
+
+def _time_ordered_order_id(order: Order) -> str:
+    """Derives a UUIDv7 order id for an order created before order ids
+    were time-ordered.
+
+    The id is deterministic (the random bits come from the old id) so
+    that migrating the same order twice yields the same key.
+    """
+    digest = hashlib.sha256(order.order_id.encode()).digest()
+    random_bits = bytearray(digest[:10])
+    random_bits[0] = (random_bits[0] & 0x0F) | 0x70
+    random_bits[2] = (random_bits[2] & 0x3F) | 0x80
+    return str(
+        uuid.UUID(
+            bytes=order.created_at_time.to_bytes(6, "big") +
+            bytes(random_bits)
+        )
+    )
+
+
+def order_month(timestamp_ms: int) -> str:
+    """Returns the "YYYY-MM" (UTC) that `timestamp_ms` falls in."""
+    return time.strftime("%Y-%m", time.gmtime(timestamp_ms / 1000))
+
+
+def address_id(address: Address) -> str:
+    """Returns the key `address` is interned under."""
+    digest = hashlib.sha256()
+    for field in (
+        address.street_address,
+        address.city,
+        address.state,
+        address.country,
+        address.zip_code,
+    ):
+        digest.update(field.strip().lower().encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def compact_order(order: Order) -> StoredOrder:
+    """Returns how `order` is stored, with its address interned under
+    `address_id(order.shipping_address)`.
+    """
+    return StoredOrder(
+        order_id=order.order_id,
+        lines=[
+            OrderLine(
+                product_id=item.product_id,
+                quantity=item.quantity,
+                price_cents=item.price_cents,
+            ) for item in order.items
+        ],
+        transaction_id=order.transaction_id,
+        subtotal_cents=order.subtotal_cents,
+        shipping_cost_cents=order.shipping_cost_cents,
+        total_cents=order.total_cents,
+        tracking_number=order.tracking_number,
+        carrier=order.carrier,
+        created_at_time=order.created_at_time,
+        address_id=address_id(order.shipping_address),
+        status=order.status,
+    )
+
+
+def decode_order(value: Value) -> Union[Order, StoredOrder]:
+    """Decodes a stored order, which orders stored before orders were
+    compacted hold in full.
+    """
+    if "lines" in value.struct_value.fields:
+        return as_model(value, model_type=StoredOrder)
+    return as_model(value, model_type=Order)
+
+
+def hydrate_order(
+    order: StoredOrder,
+    products: dict[str, Product],
+    addresses: dict[str, Address],
+) -> Order:
+    """Returns the full view of `order`, given the products it
+    references and the user's address book.
+    """
+    items = []
+    for line in order.lines:
+        # Products removed from the catalog are shown by id.
+        product = products.get(line.product_id)
+        items.append(
+            CartItem(
+                product_id=line.product_id,
+                quantity=line.quantity,
+                name=product.name if product is not None else line.product_id,
+                price_cents=line.price_cents,
+                picture=product.picture if product is not None else "",
+            )
+        )
+
+    return Order(
+        order_id=order.order_id,
+        items=items,
+        transaction_id=order.transaction_id,
+        subtotal_cents=order.subtotal_cents,
+        shipping_cost_cents=order.shipping_cost_cents,
+        total_cents=order.total_cents,
+        tracking_number=order.tracking_number,
+        carrier=order.carrier,
+        created_at_time=order.created_at_time,
+        shipping_address=addresses[order.address_id],
+        status=order.status,
+    )
 
 
+def _count_order(
+    summary: OrderSummary,
+    order: Union[Order, StoredOrder],
+) -> None:
+    summary.order_count += 1
+    summary.total_cents += order.total_cents
+
+    month = summary.months.setdefault(
+        order_month(order.created_at_time),
+        MonthlyOrderTotal(order_count=0, total_cents=0),
+    )
+    month.order_count += 1
+    month.total_cents += order.total_cents
+
+    summary.last_order_time = max(
+        summary.last_order_time or 0,
+        order.created_at_time,
+    )
+
+
+@instrumentation.servicer
 class OrdersServicer(Orders.Servicer):
 
     def authorizer(self):
@@ -24,28 +220,344 @@ class OrdersServicer(Orders.Servicer):
         context: WriterContext,
         request: AddOrderRequest,
     ) -> None:
+        if self.state.summary is None:
+            self.state.summary = await self._summarize(context)
+
+        # A retried `add_order` must not count the same order twice.
+        counted = await self._has_order(context, request.order.order_id)
+
+        # Order ids are UUIDv7s, so keying by them keeps the map sorted
+        # by creation time.
         await self.orders.insert(
             context,
             key=request.order.order_id,
-            value=from_model(request.order),
+            value=from_model(self._compact(request.order)),
         )
 
+        if not counted:
+            _count_order(self.state.summary, request.order)
+
     async def get_orders(
         self,
         context: ReaderContext,
         request: GetOrdersRequest,
     ) -> GetOrdersResponse:
-        # TODO: Add pagination.
-        orders_range = await self.orders.range(context, limit=300)
+        entries, next_cursor = await read_page(
+            context,
+            self.orders,
+            start_key=request.start_key,
+            page_size=request.page_size,
+        )
 
         return GetOrdersResponse(
-            orders=[
-                as_model(order.value, model_type=Order)
-                for order in orders_range.entries
-            ]
+            orders=await self._hydrate(
+                context,
+                [decode_order(entry.value) for entry in entries],
+            ),
+            next_cursor=next_cursor,
+        )
+
+    async def get_recent_orders(
+        self,
+        context: ReaderContext,
+        request: GetRecentOrdersRequest,
+    ) -> GetRecentOrdersResponse:
+        limit = min(request.limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+        # Keys are time-ordered, so the most recent orders are a single
+        # bounded reverse range from the cursor (or `before`).
+        if request.cursor is not None:
+            start_key = request.cursor
+        elif request.before is not None:
+            start_key = order_time_prefix(request.before)
+        else:
+            start_key = None
+
+        # Read one order more than a page, so we know whether there is a
+        # next page, and one more in case the cursor's own order (which
+        # was on the previous page) is included.
+        response = await self.orders.reverse_range(
+            context,
+            start_key=start_key,
+            limit=limit + 2,
+        )
+
+        entries = [
+            entry for entry in response.entries
+            if request.cursor is None or entry.key < request.cursor
+        ]
+
+        orders = await self._hydrate(
+            context,
+            [decode_order(entry.value) for entry in entries[:limit]],
+        )
+
+        # The cursor is the last order id on this page, rather than its
+        # time, so that orders created in the same millisecond as it are
+        # still on the next page.
+        return GetRecentOrdersResponse(
+            orders=orders,
+            next_cursor=(
+                entries[limit - 1].key if len(entries) > limit else None
+            ),
+        )
+
+    async def migrate_legacy_orders(
+        self,
+        context: TransactionContext,
+        request: MigrateLegacyOrdersRequest,
+    ) -> MigrateLegacyOrdersResponse:
+        """Moves one batch of orders from the legacy shared map into
+        this user's map.
+
+        The legacy map doesn't record who placed an order, so every
+        order in it is moved to whichever `Orders` this is called on.
+        Orders are removed from the legacy map as they are moved, so
+        calling this repeatedly until `done` drains it. Orders whose id
+        isn't time-ordered are given one derived from their creation
+        time.
+        """
+        legacy_orders = OrderedMap.ref(LEGACY_ORDERS_ID)
+
+        try:
+            entries, next_cursor = await read_page(
+                context,
+                legacy_orders,
+                start_key=None,
+                page_size=request.batch_size or DEFAULT_MIGRATION_BATCH_SIZE,
+            )
+        except OrderedMap.RangeAborted as aborted:
+            if isinstance(aborted.error, StateNotConstructed):
+                # Nothing was ever stored in the legacy map.
+                return MigrateLegacyOrdersResponse(migrated=0, done=True)
+            raise
+
+        for entry in entries:
+            order = as_model(entry.value, model_type=Order)
+            if not _is_time_ordered(order.order_id):
+                order = order.model_copy(
+                    update={"order_id": _time_ordered_order_id(order)}
+                )
+            # Until the summary has been computed there is nothing to
+            # keep up to date; it will include these orders when it is.
+            if (
+                self.state.summary is not None and
+                not await self._has_order(context, order.order_id)
+            ):
+                _count_order(self.state.summary, order)
+            await self.orders.insert(
+                context,
+                key=order.order_id,
+                value=from_model(self._compact(order)),
+            )
+            await legacy_orders.remove(context, key=entry.key)
+
+        return MigrateLegacyOrdersResponse(
+            migrated=len(entries),
+            done=next_cursor is None,
+        )
+
+    async def get_order_summary(
+        self,
+        context: ReaderContext,
+        request: GetOrderSummaryRequest,
+    ) -> GetOrderSummaryResponse:
+        summary = self.state.summary
+        if summary is None:
+            # Only users who haven't ordered since summaries were added
+            # pay for reading their whole history, and only until then.
+            summary = await self._summarize(context)
+        return GetOrderSummaryResponse(summary=summary)
+
+    async def fulfill(
+        self,
+        context: WorkflowContext,
+        request: FulfillOrderRequest,
+    ) -> None:
+        # Checkout has already committed the order's stock.
+        async def ship() -> dict:
+            return await providers.shipping().ship(
+                request.items,
+                request.shipping_address.model_dump(),
+                request.carrier,
+            )
+
+        shipping_result = await instrumentation.at_least_once(
+            "Ship order",
+            context,
+            ship,
+            type=dict,
+        )
+
+        await self.ref().per_workflow("Mark shipped").mark_shipped(
+            context,
+            order_id=request.order_id,
+            tracking_number=shipping_result["tracking_number"],
+            carrier=shipping_result["carrier"],
+        )
+
+    async def mark_shipped(
+        self,
+        context: TransactionContext,
+        request: MarkShippedRequest,
+    ) -> None:
+        order = await self._read_order(context, request.order_id)
+
+        if order is None:
+            raise Orders.MarkShippedAborted(
+                NotFound(),
+                message=f"Order not found: {request.order_id}",
+            )
+
+        # Only paid orders are waiting to ship; orders without a status
+        # were shipped when they were placed.
+        if order.status != PAID:
+            return
+
+        await self.orders.insert(
+            context,
+            key=order.order_id,
+            value=from_model(
+                order.model_copy(
+                    update={
+                        "tracking_number": request.tracking_number,
+                        "carrier": request.carrier,
+                        "status": SHIPPED,
+                    }
+                )
+            ),
         )
 
+    async def get_order(
+        self,
+        context: ReaderContext,
+        request: GetOrderRequest,
+    ) -> GetOrderResponse:
+        # Order ids are the map's keys, so this is a single lookup.
+        order = await self._read_order(context, request.order_id)
+
+        if order is None:
+            raise Orders.GetOrderAborted(
+                NotFound(),
+                message=f"Order not found: {request.order_id}",
+            )
+
+        [order] = await self._hydrate(context, [order])
+        return GetOrderResponse(order=order)
+
+    async def get_order_status(
+        self,
+        context: ReaderContext,
+        request: GetOrderStatusRequest,
+    ) -> GetOrderStatusResponse:
+        order = await self._read_order(context, request.order_id)
+
+        if order is None:
+            raise Orders.GetOrderStatusAborted(
+                NotFound(),
+                message=f"Order not found: {request.order_id}",
+            )
+
+        return GetOrderStatusResponse(
+            status=order.status or SHIPPED,
+            carrier=order.carrier,
+            tracking_number=order.tracking_number or None,
+        )
+
+    def _compact(self, order: Order) -> StoredOrder:
+        """Returns how to store `order`, adding its shipping address to
+        the address book if it isn't in it yet.
+        """
+        stored = compact_order(order)
+        addresses = self.state.addresses or {}
+        addresses.setdefault(stored.address_id, order.shipping_address)
+        self.state.addresses = addresses
+        return stored
+
+    async def _hydrate(
+        self,
+        context: ReaderContext,
+        orders: list[Union[Order, StoredOrder]],
+    ) -> list[Order]:
+        """Returns the full view of `orders`, looking up every product
+        they reference in as few catalog reads as possible.
+        """
+
+        product_ids = list(
+            dict.fromkeys(
+                line.product_id
+                for order in orders if isinstance(order, StoredOrder)
+                for line in order.lines
+            )
+        )
+
+        products: dict[str, Product] = {}
+        for start in range(0, len(product_ids), MAX_GET_PRODUCTS):
+            response = await ProductCatalog.ref(
+                PRODUCT_CATALOG_ID
+            ).get_products(
+                context,
+                product_ids=product_ids[start:start + MAX_GET_PRODUCTS],
+            )
+            products.update(
+                (product.id, product) for product in response.products
+            )
+
+        addresses = self.state.addresses or {}
+        return [
+            hydrate_order(order, products, addresses)
+            if isinstance(order, StoredOrder) else order for order in orders
+        ]
+
+    async def _has_order(self, context: ReaderContext, order_id: str) -> bool:
+        return await self._read_order(context, order_id) is not None
+
+    async def _read_order(
+        self,
+        context: ReaderContext,
+        order_id: str,
+    ) -> Optional[Union[Order, StoredOrder]]:
+        """Reads the order with `order_id` as it is stored, or returns
+        `None` if there is no such order.
+        """
+        try:
+            response = await self.orders.search(context, key=order_id)
+        except OrderedMap.SearchAborted as aborted:
+            if isinstance(aborted.error, StateNotConstructed):
+                # No order was ever stored.
+                return None
+            raise
+        if not response.found:
+            return None
+        return decode_order(response.value)
+
+    async def _summarize(self, context: ReaderContext) -> OrderSummary:
+        """Computes the summary of every order by reading them all."""
+        summary = OrderSummary(order_count=0, total_cents=0, months={})
+        start_key = None
+        while True:
+            try:
+                entries, start_key = await read_page(
+                    context,
+                    self.orders,
+                    start_key=start_key,
+                    page_size=MAX_PAGE_SIZE,
+                )
+            except OrderedMap.RangeAborted as aborted:
+                if isinstance(aborted.error, StateNotConstructed):
+                    # No order was ever stored.
+                    return summary
+                raise
+            for entry in entries:
+                _count_order(summary, decode_order(entry.value))
+            if start_key is None:
+                return summary
+
     @property
     def orders(self) -> OrderedMap.WeakReference:
-        """Helper to get reference to `OrderedMap` for orders."""
-        return OrderedMap.ref(ORDERS_ID)
+        """Helper to get reference to this user's `OrderedMap` of orders.
+
+        Each `Orders` owns its own map so that writes for different
+        users don't contend and reads only touch the caller's history.
+        """
+        return OrderedMap.ref(f"orders-{self.ref().state_id}")
@@ -0,0 +1,40 @@
+from typing import Optional
+from reboot.aio.contexts import ReaderContext
+from reboot.std.collections.ordered_map.v1.ordered_map import (
+    Entry,
+    OrderedMap,
+)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 300
+
+
+async def read_page(
+    context: ReaderContext,
+    ordered_map: OrderedMap.WeakReference,
+    *,
+    start_key: Optional[str],
+    page_size: Optional[int],
+) -> tuple[list[Entry], Optional[str]]:
+    """Reads one page of `ordered_map` starting at `start_key`.
+
+    Returns the entries of the page and the cursor (i.e., the key) of
+    the first entry of the next page, or `None` if this is the last
+    page.
+    """
+    page_size = min(page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+    # Read one extra entry so we know whether there is a next page
+    # without having to issue another range.
+    response = await ordered_map.range(
+        context,
+        start_key=start_key or None,
+        limit=page_size + 1,
+    )
+
+    entries = list(response.entries)
+
+    if len(entries) > page_size:
+        return entries[:page_size], entries[page_size].key
+
+    return entries, None
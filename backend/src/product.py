@@ -1,20 +1,206 @@
+import asyncio
+import re
+import urllib.parse
+from typing import Optional
 from store.v1.store import (
     ListProductsRequest,
     ListProductsResponse,
     GetProductRequest,
     GetProductResponse,
+    GetProductsRequest,
+    GetProductsResponse,
     AddProductRequest,
+    AddProductsRequest,
+    SearchProductsRequest,
+    SearchProductsResponse,
+    ListProductsByCategoryRequest,
+    ListProductsByCategoryResponse,
+    GetChangesSinceRequest,
+    GetChangesSinceResponse,
+    ProductUpdate,
+    UpdateProductRequest,
+    UpdateProductResponse,
+    UpdateProductsRequest,
+    UpdateProductsResponse,
+    RemoveProductRequest,
+    ReindexProductsRequest,
+    ReindexProductsResponse,
+    SeedInventoryRequest,
+    SeedInventoryResponse,
     CreateCatalogRequest,
     Product,
+    ProductChange,
+    ProductSummary,
 )
-from store.v1.store_rbt import ProductCatalog
+from store.v1.store_rbt import Inventory, ProductCatalog
 from reboot.aio.auth.authorizers import allow
 from reboot.aio.contexts import ReaderContext, WriterContext, TransactionContext
-from rbt.v1alpha1.errors_pb2 import NotFound
+from rbt.v1alpha1.errors_pb2 import (
+    FailedPrecondition,
+    InvalidArgument,
+    NotFound,
+    StateNotConstructed,
+)
+from google.protobuf.struct_pb2 import Value
 from reboot.std.collections.ordered_map.v1.ordered_map import OrderedMap
-from reboot.protobuf import from_model, as_model
-from constants import PRODUCT_CATALOG_ID
+from reboot.protobuf import from_model, as_model, from_int, as_int
+from backend.src.cache import LRUCache
+from backend.src.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    read_page,
+)
+from backend.src import instrumentation
+from constants import (
+    PRODUCT_CATALOG_ID,
+    PRODUCT_CATEGORY_INDEX_ID,
+    PRODUCT_CHANGE_LOG_ID,
+    PRODUCT_SEARCH_INDEX_ID,
+)
+
+# Relative weight of a token depending on which product field it
+# appears in; a hit on the name outranks a hit on the description.
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# How many postings are read from the search index at a time.
+POSTINGS_PAGE_SIZE = 1000
+
+# Query terms shorter than this only match whole tokens, not prefixes,
+# so that a term like "s" doesn't match nearly the whole index.
+MIN_PREFIX_LENGTH = 3
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Views of `ListProductsRequest`.
+FULL_VIEW = "full"
+SUMMARY_VIEW = "summary"
+
+# Kinds of `ProductChange`.
+UPSERT = "upsert"
+REMOVE = "remove"
+
+DEFAULT_CHANGES_LIMIT = 100
+MAX_CHANGES_LIMIT = 1000
+
+# The change log only keeps this many of the most recent changes; a
+# caller further behind than that must read the catalog again.
+CHANGE_LOG_RETENTION = 10_000
+
+DEFAULT_REINDEX_BATCH_SIZE = 100
+
+# Most products `get_products` returns at once, and how many of them
+# it reads from the catalog concurrently.
+MAX_GET_PRODUCTS = 1000
+GET_PRODUCTS_CONCURRENCY = 32
+
+# Most products `add_products` writes concurrently.
+ADD_PRODUCTS_CONCURRENCY = 32
+
+# Decoded products, keyed by product id. Shared by every
+# `ProductCatalogServicer` in this process.
+_product_cache: LRUCache[str, Product] = LRUCache(
+    name="products",
+    max_size=1000,
+    ttl_seconds=300,
+)
+
+# The catalog version `_product_cache` is current with; it is brought up
+# to date by invalidating just the products that have changed since.
+_product_cache_version: Optional[int] = None
+
+
+def _tokenize(text: str) -> list[str]:
+    """Splits `text` into lowercase alphanumeric tokens."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _index_terms(product: Product) -> dict[str, int]:
+    """Returns the weight of every token indexed for `product`."""
+    terms: dict[str, int] = {}
+    for weight, text in (
+        (NAME_WEIGHT, product.name),
+        (CATEGORY_WEIGHT, " ".join(product.categories)),
+        (DESCRIPTION_WEIGHT, product.description),
+    ):
+        for token in set(_tokenize(text)):
+            terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+def _posting_key(token: str, product_id: str) -> str:
+    # Tokens are strictly alphanumeric, so the first '/' always
+    # separates the token from the product id.
+    return f"{token}/{product_id}"
+
+
+def _as_summary(value: Value) -> ProductSummary:
+    """Decodes just the fields of a `ProductSummary` from a stored
+    `Product`, without converting the rest of it.
+    """
+    fields = value.struct_value.fields
+    return ProductSummary(
+        id=fields["id"].string_value,
+        name=fields["name"].string_value,
+        price_cents=int(fields["price_cents"].number_value),
+        picture=fields["picture"].string_value,
+    )
+
+
+def _patched(product: Product, update: ProductUpdate) -> Product:
+    """Returns `product` with the fields that are set in `update`."""
+    values = update.model_dump(
+        exclude={"product_id", "expected_version"},
+        exclude_none=True,
+    )
+    return product.model_copy(update=values)
+
+
+def _unchanged(previous: Product, product: Product) -> bool:
+    """Returns whether `product` is the same as `previous`, ignoring the
+    version (which only the catalog sets).
+    """
+    return product.model_copy(update={"version": previous.version}) == previous
+
 
+def _conflicts(product: Product, expected_version: Optional[int]) -> bool:
+    # Products stored before they had versions count as version 0.
+    return (
+        expected_version is not None and
+        expected_version != (product.version or 0)
+    )
+
+
+def _change_key(version: int) -> str:
+    # Zero-padded so that keys sort in version order.
+    return f"{version:020d}"
+
+
+def _category_prefix(category: str) -> str:
+    # Categories are matched case-insensitively, and quoted so that the
+    # first '/' always separates the category from the rest of the key.
+    return urllib.parse.quote(category.strip().lower(), safe="") + "/"
+
+
+def _price_key(price_cents: int) -> str:
+    # Zero-padded so that keys sort in price order.
+    return f"{max(price_cents, 0):012d}"
+
+
+def _category_keys(product: Product) -> set[str]:
+    return {
+        _category_prefix(category) + _price_key(product.price_cents) +
+        "/" + product.id
+        for category in product.categories
+        if category.strip()
+    }
+
+
+@instrumentation.servicer
 class ProductCatalogServicer(ProductCatalog.Servicer):
 
     def authorizer(self):
@@ -25,43 +211,849 @@ class ProductCatalogServicer(ProductCatalog.Servicer):
         context: ReaderContext,
         request: ListProductsRequest,
     ) -> ListProductsResponse:
-        # TODO: Add pagination.
-        products_range = await self.catalog.range(context, limit=300)
+        view = request.view or FULL_VIEW
+        if view not in (FULL_VIEW, SUMMARY_VIEW):
+            raise ProductCatalog.ListProductsAborted(
+                InvalidArgument(),
+                message=f"Unknown view: {view}",
+            )
+
+        # Read the version before the catalog, so that applying the
+        # changes since it never misses one.
+        version = self.state.version or 0
+
+        entries, next_cursor = await read_page(
+            context,
+            self.catalog,
+            start_key=request.start_key,
+            page_size=request.page_size,
+        )
+
+        if view == SUMMARY_VIEW:
+            return ListProductsResponse(
+                products=[],
+                next_cursor=next_cursor,
+                summaries=[_as_summary(entry.value) for entry in entries],
+                version=version,
+            )
 
         products = [
-            as_model(product.value, model_type=Product)
-            for product in products_range.entries
+            as_model(entry.value, model_type=Product) for entry in entries
         ]
 
-        return ListProductsResponse(products=products)
+        return ListProductsResponse(
+            products=products,
+            next_cursor=next_cursor,
+            version=version,
+        )
 
     async def get_product(
         self,
         context: ReaderContext,
         request: GetProductRequest,
     ) -> GetProductResponse:
-        response = await self.catalog.search(context, key=request.product_id)
+        product = await self._get_product(context, request.product_id)
 
-        if response.found:
-            product = as_model(response.value, model_type=Product)
+        if product is not None:
             return GetProductResponse(product=product)
 
         raise ProductCatalog.GetProductAborted(
             NotFound(), message=f"Product not found: {request.product_id}"
         )
 
+    async def get_products(
+        self,
+        context: ReaderContext,
+        request: GetProductsRequest,
+    ) -> GetProductsResponse:
+        product_ids = list(dict.fromkeys(request.product_ids))
+
+        if len(product_ids) > MAX_GET_PRODUCTS:
+            raise ProductCatalog.GetProductsAborted(
+                InvalidArgument(),
+                message=(
+                    f"Can get at most {MAX_GET_PRODUCTS} products at once, "
+                    f"not {len(product_ids)}"
+                ),
+            )
+
+        products = await self._get_products(context, product_ids)
+
+        return GetProductsResponse(
+            products=[
+                products[product_id]
+                for product_id in product_ids
+                if product_id in products
+            ],
+            missing_ids=[
+                product_id
+                for product_id in product_ids
+                if product_id not in products
+            ],
+        )
+
     async def add_product(
         self,
         context: TransactionContext,
         request: AddProductRequest,
     ) -> None:
-        await self.catalog.insert(
+        await self._add_product(
+            context,
+            request.product,
+            previous=await self._read_stored_product(
+                context,
+                request.product.id,
+            ),
+        )
+
+    async def add_products(
+        self,
+        context: TransactionContext,
+        request: AddProductsRequest,
+    ) -> None:
+        # All products are added in this one transaction; callers
+        # loading large feeds should split them into chunks (see
+        # `backend/src/catalog_loader.py`).
+        #
+        # A later product replaces an earlier one with the same id, as
+        # it would if they were added one at a time.
+        products = {product.id: product for product in request.products}
+
+        stored = await asyncio.gather(
+            *(
+                self._read_stored_product(context, product_id)
+                for product_id in products
+            )
+        )
+
+        # Bound how many products a large chunk writes at once.
+        semaphore = asyncio.Semaphore(ADD_PRODUCTS_CONCURRENCY)
+
+        async def add(product: Product, previous: Optional[Product]):
+            async with semaphore:
+                await self._add_product(context, product, previous=previous)
+
+        await asyncio.gather(
+            *(
+                add(product, previous)
+                for product, previous in zip(products.values(), stored)
+            )
+        )
+
+    async def update_product(
+        self,
+        context: TransactionContext,
+        request: UpdateProductRequest,
+    ) -> UpdateProductResponse:
+        update = request.update
+        previous = await self._read_stored_product(context, update.product_id)
+
+        if previous is None:
+            raise ProductCatalog.UpdateProductAborted(
+                NotFound(),
+                message=f"Product not found: {update.product_id}",
+            )
+
+        if _conflicts(previous, update.expected_version):
+            raise ProductCatalog.UpdateProductAborted(
+                FailedPrecondition(),
+                message=(
+                    f"Product {update.product_id} is at version "
+                    f"{previous.version or 0}, not {update.expected_version}"
+                ),
+            )
+
+        product = _patched(previous, update)
+        if product != previous:
+            product = await self._put_product(
+                context,
+                product,
+                previous=previous,
+            )
+
+        return UpdateProductResponse(product=product)
+
+    async def update_products(
+        self,
+        context: TransactionContext,
+        request: UpdateProductsRequest,
+    ) -> UpdateProductsResponse:
+        # Like `add_products`, callers applying large feeds should split
+        # them into chunks (see `backend/src/catalog_loader.py`).
+        product_ids = list(
+            dict.fromkeys(update.product_id for update in request.updates)
+        )
+        stored = await asyncio.gather(
+            *[
+                self._read_stored_product(context, product_id)
+                for product_id in product_ids
+            ]
+        )
+        products = dict(zip(product_ids, stored))
+
+        updated: set[str] = set()
+        missing_ids: list[str] = []
+        conflicting_ids: list[str] = []
+
+        for update in request.updates:
+            previous = products[update.product_id]
+            if previous is None:
+                missing_ids.append(update.product_id)
+                continue
+            if _conflicts(previous, update.expected_version):
+                conflicting_ids.append(update.product_id)
+                continue
+
+            # Unchanged products (e.g., a price feed restating today's
+            # price) aren't written at all.
+            product = _patched(previous, update)
+            if product != previous:
+                products[update.product_id] = await self._put_product(
+                    context,
+                    product,
+                    previous=previous,
+                )
+                updated.add(update.product_id)
+
+        return UpdateProductsResponse(
+            updated=len(updated),
+            missing_ids=missing_ids,
+            conflicting_ids=conflicting_ids,
+        )
+
+    async def remove_product(
+        self,
+        context: TransactionContext,
+        request: RemoveProductRequest,
+    ) -> None:
+        previous = await self._read_stored_product(
+            context,
+            request.product_id,
+        )
+
+        if previous is None:
+            return
+
+        if _conflicts(previous, request.expected_version):
+            raise ProductCatalog.RemoveProductAborted(
+                FailedPrecondition(),
+                message=(
+                    f"Product {request.product_id} is at version "
+                    f"{previous.version or 0}, not {request.expected_version}"
+                ),
+            )
+
+        version = self._bump_version()
+
+        await self.catalog.remove(context, key=previous.id)
+
+        # Nobody can buy what's no longer in the catalog.
+        await Inventory.ref(previous.id).set_stock(context, quantity=0)
+
+        await self._log_change(
+            context,
+            version=version,
+            product_id=previous.id,
+            kind=REMOVE,
+        )
+
+        await self._reindex(context, None, previous=previous)
+
+    async def reindex_products(
+        self,
+        context: TransactionContext,
+        request: ReindexProductsRequest,
+    ) -> ReindexProductsResponse:
+        """Indexes one batch of products, e.g., products that were stored
+        before there was a search index.
+
+        Indexing a product again is a no-op, so calling this repeatedly
+        with the returned cursor until there is none indexes the whole
+        catalog.
+        """
+        entries, next_cursor = await read_page(
+            context,
+            self.catalog,
+            start_key=request.start_key,
+            page_size=request.batch_size or DEFAULT_REINDEX_BATCH_SIZE,
+        )
+
+        await asyncio.gather(
+            *(
+                self._reindex(
+                    context,
+                    as_model(entry.value, model_type=Product),
+                    previous=None,
+                ) for entry in entries
+            )
+        )
+
+        return ReindexProductsResponse(
+            reindexed=len(entries),
+            next_cursor=next_cursor,
+        )
+
+    async def seed_inventory(
+        self,
+        context: TransactionContext,
+        request: SeedInventoryRequest,
+    ) -> SeedInventoryResponse:
+        """Seeds the `Inventory` of one batch of products from their
+        catalog stock, e.g., products that were stored before stock was
+        tracked by `Inventory`.
+
+        Products whose `Inventory` already has stock are left alone, so
+        calling this repeatedly with the returned cursor until there is
+        none seeds the whole catalog.
+        """
+        entries, next_cursor = await read_page(
+            context,
+            self.catalog,
+            start_key=request.start_key,
+            page_size=request.batch_size or DEFAULT_REINDEX_BATCH_SIZE,
+        )
+
+        products = [
+            as_model(entry.value, model_type=Product) for entry in entries
+        ]
+
+        await asyncio.gather(
+            *(
+                Inventory.ref(product.id).seed_stock(
+                    context,
+                    quantity=product.stock_quantity,
+                ) for product in products
+            )
+        )
+
+        return SeedInventoryResponse(
+            seeded=len(products),
+            next_cursor=next_cursor,
+        )
+
+    async def search_products(
+        self,
+        context: ReaderContext,
+        request: SearchProductsRequest,
+    ) -> SearchProductsResponse:
+        # Deduplicate while preserving order.
+        terms = list(dict.fromkeys(_tokenize(request.query)))
+
+        page_size = min(
+            request.page_size or DEFAULT_SEARCH_PAGE_SIZE,
+            MAX_SEARCH_PAGE_SIZE,
+        )
+        offset = max(request.offset or 0, 0)
+
+        if len(terms) == 0:
+            return SearchProductsResponse(products=[], total_hits=0)
+
+        # Every posting of every term is read, so that each matching
+        # product is scored (and counted), not just those that happen to
+        # sort first.
+        term_scores = await asyncio.gather(
+            *[self._score_term(context, term) for term in terms]
+        )
+
+        scores: dict[str, int] = {}
+        for product_scores in term_scores:
+            for product_id, score in product_scores.items():
+                scores[product_id] = scores.get(product_id, 0) + score
+
+        ranked = sorted(
+            scores.keys(),
+            key=lambda product_id: (-scores[product_id], product_id),
+        )
+        page = ranked[offset:offset + page_size]
+
+        products_by_id = await self._get_products(context, page)
+        products = [
+            products_by_id[product_id]
+            for product_id in page
+            if product_id in products_by_id
+        ]
+
+        next_offset = offset + page_size
+        return SearchProductsResponse(
+            products=products,
+            total_hits=len(ranked),
+            next_offset=next_offset if next_offset < len(ranked) else None,
+        )
+
+    async def _score_term(
+        self,
+        context: ReaderContext,
+        term: str,
+    ) -> dict[str, int]:
+        """Returns the score of `term` for every product it matches.
+
+        A term matches a token exactly or as a prefix (so that "shirt"
+        also finds "shirts"); exact matches count double, and only the
+        best match per product counts.
+        """
+        prefix = term if len(term) >= MIN_PREFIX_LENGTH else f"{term}/"
+
+        scores: dict[str, int] = {}
+        start_key = prefix
+        while True:
+            response = await self.search_index.range(
+                context,
+                start_key=start_key,
+                limit=POSTINGS_PAGE_SIZE,
+            )
+            entries = list(response.entries)
+            for entry in entries:
+                if not entry.key.startswith(prefix):
+                    return scores
+                token, _, product_id = entry.key.partition("/")
+                score = as_int(entry.value) * (2 if token == term else 1)
+                scores[product_id] = max(scores.get(product_id, 0), score)
+
+            if len(entries) < POSTINGS_PAGE_SIZE:
+                return scores
+
+            # Continue just after the last key we've seen.
+            start_key = entries[-1].key + "\0"
+
+    async def list_products_by_category(
+        self,
+        context: ReaderContext,
+        request: ListProductsByCategoryRequest,
+    ) -> ListProductsByCategoryResponse:
+        prefix = _category_prefix(request.category)
+        page_size = min(request.page_size or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+
+        # Within a category the index is ordered by price, so the price
+        # range is a single range of keys, read without reading any
+        # products. We read one match more than a page so we know where
+        # the next page starts.
+        start_key = prefix + _price_key(request.min_price_cents or 0)
+        if request.start_key is not None:
+            start_key = max(start_key, prefix + request.start_key)
+
+        response = await self.category_index.range(
             context,
-            key=request.product.id,
-            value=from_model(request.product),
+            start_key=start_key,
+            limit=page_size + 1,
+        )
+
+        # The part of each key after the category, which is also the
+        # cursor for the page starting there.
+        cursors: list[str] = []
+        product_ids: list[str] = []
+        for entry in response.entries:
+            if not entry.key.startswith(prefix):
+                break
+            cursor = entry.key[len(prefix):]
+            price_key, _, product_id = cursor.partition("/")
+            if (
+                request.max_price_cents is not None and
+                int(price_key) > request.max_price_cents
+            ):
+                break
+            cursors.append(cursor)
+            product_ids.append(product_id)
+
+        next_cursor = None
+        if len(product_ids) > page_size:
+            next_cursor = cursors[page_size]
+            product_ids = product_ids[:page_size]
+
+        products_by_id = await self._get_products(context, product_ids)
+        products = [
+            products_by_id[product_id]
+            for product_id in product_ids
+            if product_id in products_by_id
+        ]
+
+        return ListProductsByCategoryResponse(
+            products=products,
+            next_cursor=next_cursor,
+        )
+
+    async def get_changes_since(
+        self,
+        context: ReaderContext,
+        request: GetChangesSinceRequest,
+    ) -> GetChangesSinceResponse:
+        # Read the version before the change log, so that we never claim
+        # to be current with a change we haven't returned.
+        version = max(self.state.version or 0, request.version)
+
+        if request.version + 1 < self._oldest_logged_version():
+            return GetChangesSinceResponse(
+                changes=[],
+                version=request.version,
+                has_more=False,
+                resync_required=True,
+            )
+
+        changes, has_more = await self._read_changes(
+            context,
+            since=request.version,
+            limit=min(
+                request.limit or DEFAULT_CHANGES_LIMIT,
+                MAX_CHANGES_LIMIT,
+            ),
+        )
+
+        if has_more:
+            version = changes[-1].version
+        elif len(changes) > 0:
+            version = max(version, changes[-1].version)
+
+        return GetChangesSinceResponse(
+            changes=changes,
+            version=version,
+            has_more=has_more,
+        )
+
+    async def _read_changes(
+        self,
+        context: ReaderContext,
+        *,
+        since: int,
+        limit: int,
+    ) -> tuple[list[ProductChange], bool]:
+        """Returns up to `limit` changes with a version greater than
+        `since`, oldest first, and whether there are more.
+        """
+        try:
+            response = await self.change_log.range(
+                context,
+                start_key=_change_key(since + 1),
+                limit=limit + 1,
+            )
+        except OrderedMap.RangeAborted as aborted:
+            # Nothing has been logged yet.
+            if isinstance(aborted.error, StateNotConstructed):
+                return [], False
+            raise
+
+        changes = [
+            as_model(entry.value, model_type=ProductChange)
+            for entry in response.entries
+        ]
+        return changes[:limit], len(changes) > limit
+
+    async def _get_product(
+        self,
+        context: ReaderContext,
+        product_id: str,
+    ) -> Optional[Product]:
+        """Returns the product with `product_id`, or `None` if there is
+        no such product, preferring the in-process cache.
+        """
+        products = await self._get_products(context, [product_id])
+        return products.get(product_id)
+
+    async def _get_products(
+        self,
+        context: ReaderContext,
+        product_ids: list[str],
+    ) -> dict[str, Product]:
+        """Returns the products with `product_ids` that exist, keyed by
+        id, preferring the in-process cache and reading the rest from
+        the catalog concurrently.
+        """
+        # Read the version before the catalog so that a product read at
+        # an older version is never cached as current.
+        version = self.state.version or 0
+
+        if _product_cache_version != version:
+            await self._sync_product_cache(context, version)
+
+        cache_is_current = _product_cache_version == version
+
+        products: dict[str, Product] = {}
+        to_read: list[str] = []
+        for product_id in dict.fromkeys(product_ids):
+            cached = (
+                _product_cache.get(product_id) if cache_is_current else None
+            )
+            if cached is not None:
+                products[product_id] = cached
+            else:
+                to_read.append(product_id)
+
+        # Bound how many reads a single large request has in flight.
+        semaphore = asyncio.Semaphore(GET_PRODUCTS_CONCURRENCY)
+
+        async def search(product_id: str):
+            async with semaphore:
+                return await self.catalog.search(context, key=product_id)
+
+        responses = await asyncio.gather(
+            *(search(product_id) for product_id in to_read)
+        )
+
+        # Another call may have brought the cache past `version` while
+        # we were reading, in which case what we read may be stale.
+        cache_is_current = (
+            cache_is_current and _product_cache_version == version
         )
 
+        for product_id, response in zip(to_read, responses):
+            if not response.found:
+                continue
+            product = as_model(response.value, model_type=Product)
+            products[product_id] = product
+            if cache_is_current:
+                _product_cache.put(product_id, product)
+
+        return products
+
+    async def _sync_product_cache(
+        self,
+        context: ReaderContext,
+        version: int,
+    ) -> None:
+        """Brings `_product_cache` up to `version` by invalidating the
+        products that changed since it was last brought up to date.
+        """
+        global _product_cache_version
+        synced_version = _product_cache_version
+
+        if synced_version is not None and synced_version > version:
+            # The cache is already newer than what this call has seen.
+            return
+
+        if (
+            synced_version is None or
+            synced_version + 1 < self._oldest_logged_version()
+        ):
+            _product_cache.clear()
+        else:
+            changes, has_more = await self._read_changes(
+                context,
+                since=synced_version,
+                limit=MAX_CHANGES_LIMIT,
+            )
+            if has_more:
+                # Too much has changed to be worth applying one by one.
+                _product_cache.clear()
+            else:
+                for change in changes:
+                    _product_cache.invalidate(change.product_id)
+
+        if _product_cache_version == synced_version:
+            _product_cache_version = version
+
+    def _bump_version(self) -> int:
+        """Returns the catalog's next version, which invalidates every
+        cached copy of the product it's used for once the transaction
+        commits.
+        """
+        self.state.version = (self.state.version or 0) + 1
+        return self.state.version
+
+    def _oldest_logged_version(self) -> int:
+        """Returns the version of the oldest change still in the change
+        log.
+        """
+        return max((self.state.version or 0) - CHANGE_LOG_RETENTION + 1, 1)
+
+    async def _log_change(
+        self,
+        context: TransactionContext,
+        *,
+        version: int,
+        product_id: str,
+        kind: str,
+        product: Optional[Product] = None,
+    ) -> None:
+        """Logs the change made at `version`, dropping the change that
+        has just fallen out of the change log's window.
+        """
+        writes = [
+            self.change_log.insert(
+                context,
+                key=_change_key(version),
+                value=from_model(
+                    ProductChange(
+                        version=version,
+                        product_id=product_id,
+                        kind=kind,
+                        product=product,
+                    )
+                ),
+            )
+        ]
+
+        # Every version is logged, so dropping one for every one that is
+        # logged keeps exactly the most recent `CHANGE_LOG_RETENTION`.
+        expired = version - CHANGE_LOG_RETENTION
+        if expired > 0:
+            writes.append(
+                self.change_log.remove(context, key=_change_key(expired))
+            )
+
+        await asyncio.gather(*writes)
+
+    async def _read_stored_product(
+        self,
+        context: ReaderContext,
+        product_id: str,
+    ) -> Optional[Product]:
+        """Reads `product_id` from the catalog itself, bypassing the
+        cache, as writes must.
+        """
+        response = await self.catalog.search(context, key=product_id)
+        if not response.found:
+            return None
+        return as_model(response.value, model_type=Product)
+
+    async def _add_product(
+        self,
+        context: TransactionContext,
+        product: Product,
+        *,
+        previous: Optional[Product],
+    ) -> None:
+        """Inserts (or replaces) `product`, unless it's the same as the
+        `previous` one, e.g., when an unchanged feed is loaded again.
+        """
+        if previous is not None and _unchanged(previous, product):
+            return
+
+        await self._put_product(context, product, previous=previous)
+
+    async def _put_product(
+        self,
+        context: TransactionContext,
+        product: Product,
+        *,
+        previous: Optional[Product],
+    ) -> Product:
+        """Stores `product` in place of `previous`, if any, and returns
+        it as stored.
+        """
+        product = product.model_copy(update={"version": self._bump_version()})
+
+        # None of these writes depend on each other.
+        await asyncio.gather(
+            self._update_stock(context, product, previous=previous),
+            self.catalog.insert(
+                context,
+                key=product.id,
+                value=from_model(product),
+            ),
+            self._log_change(
+                context,
+                version=product.version,
+                product_id=product.id,
+                kind=UPSERT,
+                product=product,
+            ),
+            self._reindex(context, product, previous=previous),
+        )
+
+        return product
+
+    async def _update_stock(
+        self,
+        context: TransactionContext,
+        product: Product,
+        *,
+        previous: Optional[Product],
+    ) -> None:
+        # Stock is tracked by the product's `Inventory`, which checkouts
+        # decrement, so the catalog's stock level is out of date as soon
+        # as anything sells. Changing it (e.g., a restock) adjusts the
+        # stock by the difference, rather than undoing those sales.
+        if previous is None:
+            await Inventory.ref(product.id).set_stock(
+                context,
+                quantity=product.stock_quantity,
+            )
+        elif previous.stock_quantity != product.stock_quantity:
+            await Inventory.ref(product.id).adjust_stock(
+                context,
+                delta=product.stock_quantity - previous.stock_quantity,
+                initial_quantity=previous.stock_quantity,
+            )
+
+    async def _reindex(
+        self,
+        context: TransactionContext,
+        product: Optional[Product],
+        *,
+        previous: Optional[Product],
+    ) -> None:
+        """Updates the search and category indexes for `previous` having
+        been replaced by `product` (`None` for none), touching only the
+        entries that actually changed.
+        """
+        terms = _index_terms(product) if product is not None else {}
+        previous_terms = (
+            _index_terms(previous) if previous is not None else {}
+        )
+
+        category_keys = (
+            _category_keys(product) if product is not None else set()
+        )
+        previous_category_keys = (
+            _category_keys(previous) if previous is not None else set()
+        )
+
+        # Every entry is written independently of the others.
+        writes = [
+            self.search_index.remove(
+                context,
+                key=_posting_key(token, previous.id),
+            ) for token in previous_terms.keys() - terms.keys()
+        ] + [
+            self.search_index.insert(
+                context,
+                key=_posting_key(token, product.id),
+                value=from_int(weight),
+            )
+            for token, weight in terms.items()
+            if previous_terms.get(token) != weight
+        ] + [
+            self.category_index.remove(context, key=key)
+            for key in previous_category_keys - category_keys
+        ] + [
+            # Keys include the price, so a new price is a new key.
+            self.category_index.insert(
+                context,
+                key=key,
+                value=from_int(product.price_cents),
+            ) for key in category_keys - previous_category_keys
+        ]
+
+        await asyncio.gather(*writes)
+
     @property
     def catalog(self) -> OrderedMap.WeakReference:
         """Helper to get reference to `OrderedMap` for catalog."""
         return OrderedMap.ref(PRODUCT_CATALOG_ID)
+
+    @property
+    def search_index(self) -> OrderedMap.WeakReference:
+        """Helper to get reference to `OrderedMap` for the search index.
+
+        Keys are `{token}/{product_id}` and values are the weight of
+        the token for that product.
+        """
+        return OrderedMap.ref(PRODUCT_SEARCH_INDEX_ID)
+
+    @property
+    def category_index(self) -> OrderedMap.WeakReference:
+        """Helper to get reference to `OrderedMap` for the category index.
+
+        Keys are `{quoted category}/{zero-padded price}/{product_id}`
+        and values are the price of the product, so that a price range
+        within a category is a single range of keys.
+        """
+        return OrderedMap.ref(PRODUCT_CATEGORY_INDEX_ID)
+
+    @property
+    def change_log(self) -> OrderedMap.WeakReference:
+        """Helper to get reference to `OrderedMap` for the change log.
+
+        Keys are zero-padded catalog versions and values are the
+        `ProductChange` made at that version; only the most recent
+        `CHANGE_LOG_RETENTION` changes are kept.
+        """
+        return OrderedMap.ref(PRODUCT_CHANGE_LOG_ID)
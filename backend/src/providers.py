@@ -0,0 +1,361 @@
+"""The shipping and payment providers that checkout calls.
+
+Checkout uses in-process mocks unless `SHIPPING_PROVIDER_URL` or
+`PAYMENT_PROVIDER_URL` points it at an HTTP provider (e.g., the fake
+one in `backend.src.fake_providers`). HTTP providers are called through
+a `ProviderClient`, which keeps a pool of keep-alive connections so
+that checkouts don't each pay for a new connection (and TLS handshake).
+"""
+import asyncio
+import functools
+import os
+import random
+import time
+from typing import Any, Optional, Protocol
+import httpx
+from store.v1.store import CartItem
+from backend.src import metrics
+from backend.src.cache import LRUCache
+
+DEFAULT_TIMEOUT_SECONDS = 10.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 2.0
+# Most requests in flight to a single provider; further calls wait.
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 32
+# Consecutive failures after which calls fail fast, and for how long.
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+
+# We don't know what products weigh, so assume each line of a cart
+# weighs this.
+POUNDS_PER_ITEM = 2
+QUOTE_TTL_SECONDS = 10 * 60
+
+provider_requests = metrics.counter(
+    "provider_requests_total",
+    "Number of requests to shipping and payment providers, by provider "
+    "and outcome.",
+)
+
+
+class ProviderError(Exception):
+    pass
+
+
+class CircuitOpenError(ProviderError):
+    pass
+
+
+class CircuitBreaker:
+    """Fails calls fast once a provider has failed `failure_threshold`
+    times in a row, until `reset_seconds` have passed; then one call is
+    let through to see whether the provider has recovered.
+    """
+
+    def __init__(self, *, failure_threshold: int, reset_seconds: float):
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    def check(self, name: str) -> None:
+        if self._opened_at is None:
+            return
+        now = time.monotonic()
+        if now - self._opened_at < self._reset_seconds:
+            raise CircuitOpenError(f"{name} is unavailable; not calling it")
+        # Let this call through, but keep failing others fast until we
+        # know how it went.
+        self._opened_at = now
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._failures >= self._failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+class ProviderClient:
+    """A pooled, keep-alive HTTP client for a single provider, with a
+    limit on concurrent requests, timeouts and a circuit breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        *,
+        timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_seconds: float = DEFAULT_RESET_SECONDS,
+    ):
+        self.name = name
+        self._base_url = base_url
+        self._timeout = httpx.Timeout(
+            timeout_seconds,
+            connect=DEFAULT_CONNECT_TIMEOUT_SECONDS,
+        )
+        self._limits = httpx.Limits(
+            max_connections=max_concurrency,
+            max_keepalive_connections=min(
+                max_concurrency,
+                DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._breaker = CircuitBreaker(
+            failure_threshold=failure_threshold,
+            reset_seconds=reset_seconds,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def post(self, path: str, payload: dict[str, Any]) -> dict:
+        self._breaker.check(self.name)
+
+        async with self._semaphore:
+            try:
+                response = await self._http().post(path, json=payload)
+                response.raise_for_status()
+            except httpx.HTTPStatusError as error:
+                # The provider answered, so it's up; it just rejected
+                # this request (e.g., a declined card).
+                if error.response.status_code < 500:
+                    self._breaker.record_success()
+                else:
+                    self._breaker.record_failure()
+                provider_requests.inc(provider=self.name, outcome="error")
+                raise ProviderError(
+                    f"{self.name} {path} failed: {error}"
+                ) from error
+            except httpx.HTTPError as error:
+                self._breaker.record_failure()
+                provider_requests.inc(provider=self.name, outcome="error")
+                raise ProviderError(
+                    f"{self.name} {path} failed: {error!r}"
+                ) from error
+
+        self._breaker.record_success()
+        provider_requests.inc(provider=self.name, outcome="ok")
+        return response.json()
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _http(self) -> httpx.AsyncClient:
+        # Created lazily so that it's bound to the event loop that uses
+        # it, and then shared by every call.
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self._base_url,
+                timeout=self._timeout,
+                limits=self._limits,
+            )
+        return self._client
+
+
+class ShippingProvider(Protocol):
+
+    async def quote(self, weight_pounds: int, address: dict) -> dict:
+        ...
+
+    async def ship(
+        self,
+        items: list[CartItem],
+        address: dict,
+        carrier: str,
+    ) -> dict:
+        ...
+
+
+class PaymentProvider(Protocol):
+
+    async def charge(self, card_info: dict, amount_cents: int) -> dict:
+        ...
+
+    async def refund(self, transaction_id: str, amount_cents: int) -> dict:
+        ...
+
+
+class MockShippingProvider:
+
+    async def quote(self, weight_pounds: int, address: dict) -> dict:
+        base_cost = 500  # $5.00 base.
+        weight_cost = weight_pounds * 50  # $0.50 per pound.
+        total_cost = base_cost + weight_cost
+
+        return {
+            "cost_cents": total_cost,
+            "carrier": "Mock Shipping Co.",
+            "estimated_days": random.randint(3, 7),
+        }
+
+    async def ship(self, items: list, address: dict, carrier: str) -> dict:
+        # Non-idempotent, like a real shipping API.
+        return {
+            "tracking_number":
+                f"TRACK{random.randint(1000000000, 9999999999)}",
+            "carrier": carrier,
+            "status": "shipped",
+        }
+
+
+class MockPaymentProvider:
+
+    async def charge(self, card_info: dict, amount_cents: int) -> dict:
+        # Non-idempotent, like a real payment processor.
+        return {
+            "transaction_id": f"txn_{random.randint(100000, 999999)}",
+            "last_four": str(card_info.get("number", "0000"))[-4:],
+            "amount_cents": amount_cents,
+        }
+
+    async def refund(self, transaction_id: str, amount_cents: int) -> dict:
+        # Non-idempotent, like a real payment processor.
+        return {
+            "refund_id": f"rfd_{random.randint(100000, 999999)}",
+            "transaction_id": transaction_id,
+            "amount_cents": amount_cents,
+        }
+
+
+class HttpShippingProvider:
+
+    def __init__(self, client: ProviderClient):
+        self._client = client
+
+    async def quote(self, weight_pounds: int, address: dict) -> dict:
+        return await self._client.post(
+            "/quote",
+            {
+                "weight_pounds": weight_pounds,
+                "address": address,
+            },
+        )
+
+    async def ship(
+        self,
+        items: list[CartItem],
+        address: dict,
+        carrier: str,
+    ) -> dict:
+        return await self._client.post(
+            "/ship",
+            {
+                "items": [item.model_dump() for item in items],
+                "address": address,
+                "carrier": carrier,
+            },
+        )
+
+
+class HttpPaymentProvider:
+
+    def __init__(self, client: ProviderClient):
+        self._client = client
+
+    async def charge(self, card_info: dict, amount_cents: int) -> dict:
+        return await self._client.post(
+            "/charge",
+            {
+                "card": card_info,
+                "amount_cents": amount_cents,
+            },
+        )
+
+    async def refund(self, transaction_id: str, amount_cents: int) -> dict:
+        return await self._client.post(
+            "/refund",
+            {
+                "transaction_id": transaction_id,
+                "amount_cents": amount_cents,
+            },
+        )
+
+
+def _client(name: str, url: str) -> ProviderClient:
+    return ProviderClient(
+        name,
+        url,
+        timeout_seconds=float(
+            os.environ.get(
+                "PROVIDER_TIMEOUT_SECONDS",
+                DEFAULT_TIMEOUT_SECONDS,
+            )
+        ),
+        max_concurrency=int(
+            os.environ.get(
+                "PROVIDER_MAX_CONCURRENCY",
+                DEFAULT_MAX_CONCURRENCY,
+            )
+        ),
+    )
+
+
+@functools.cache
+def shipping() -> ShippingProvider:
+    url = os.environ.get("SHIPPING_PROVIDER_URL")
+    if url is None:
+        return MockShippingProvider()
+    return HttpShippingProvider(_client("shipping", url))
+
+
+@functools.cache
+def payment() -> PaymentProvider:
+    url = os.environ.get("PAYMENT_PROVIDER_URL")
+    if url is None:
+        return MockPaymentProvider()
+    return HttpPaymentProvider(_client("payment", url))
+
+
+# Shipping quotes by normalized address and weight, shared by every user
+# in this process.
+_quote_cache: LRUCache[tuple, dict] = LRUCache(
+    name="shipping_quotes",
+    max_size=10000,
+    ttl_seconds=QUOTE_TTL_SECONDS,
+)
+
+
+def shipping_weight_pounds(items: list[CartItem]) -> int:
+    """Returns the weight that `items` are quoted for: a fixed weight
+    per cart line, whatever its quantity, as checkout has always
+    charged.
+    """
+    return len(items) * POUNDS_PER_ITEM
+
+
+def _normalized_address(address: dict) -> tuple[str, ...]:
+    return tuple(
+        " ".join(str(address.get(field, "")).lower().split())
+        for field in (
+            "street_address",
+            "city",
+            "state",
+            "country",
+            "zip_code",
+        )
+    )
+
+
+async def quote_shipping(items: list[CartItem], address: dict) -> dict:
+    """Returns a shipping quote for `items` to `address`, reusing a
+    recent quote for the same address and weight if there is one.
+
+    Quotes are for the exact weight, never an approximation of it, as
+    the quoted cost is what the customer is charged.
+    """
+    weight_pounds = shipping_weight_pounds(items)
+    key = (_normalized_address(address), weight_pounds)
+
+    quote = _quote_cache.get(key)
+    if quote is None:
+        quote = await shipping().quote(weight_pounds, address)
+        _quote_cache.put(key, quote)
+
+    return dict(quote)
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import timedelta
+from store.v1.store import (
+    ReserveRequest,
+    CommitReservationRequest,
+    ReleaseReservationRequest,
+)
+from store.v1.store_rbt import Inventory, Reservation
+from reboot.aio.auth.authorizers import allow
+from reboot.aio.contexts import TransactionContext
+from rbt.v1alpha1.errors_pb2 import FailedPrecondition
+from backend.src.inventory import now_ms
+from backend.src import instrumentation
+
+# How long stock stays held for a checkout that hasn't been paid for.
+DEFAULT_RESERVATION_TTL_SECONDS = 15 * 60
+
+RESERVED = "reserved"
+COMMITTED = "committed"
+RELEASED = "released"
+
+
+@instrumentation.servicer
+class ReservationServicer(Reservation.Servicer):
+    """Holds stock of several products for one checkout, keyed by order
+    id, so that either all of a cart's lines are in stock or none are
+    held.
+    """
+
+    def authorizer(self):
+        return allow()
+
+    async def reserve(
+        self,
+        context: TransactionContext,
+        request: ReserveRequest,
+    ) -> None:
+        if self.state.status is not None:
+            return
+
+        ttl_seconds = request.ttl_seconds or DEFAULT_RESERVATION_TTL_SECONDS
+        expires_at_time = now_ms() + ttl_seconds * 1000
+        reservation_id = self.ref().state_id
+
+        # Each product is held by its own `Inventory`, all within this
+        # transaction, so one out-of-stock line holds nothing at all.
+        await asyncio.gather(
+            *(
+                Inventory.ref(line.product_id).reserve(
+                    context,
+                    reservation_id=reservation_id,
+                    quantity=line.quantity,
+                    expires_at_time=expires_at_time,
+                ) for line in request.lines
+            )
+        )
+
+        self.state.lines = request.lines
+        self.state.status = RESERVED
+        self.state.expires_at_time = expires_at_time
+
+        # Holds expire by themselves, but releasing them explicitly keeps
+        # the `Inventory` states from accumulating them.
+        await Reservation.ref(reservation_id).schedule(
+            when=timedelta(seconds=ttl_seconds),
+        ).release(context)
+
+    async def commit(
+        self,
+        context: TransactionContext,
+        request: CommitReservationRequest,
+    ) -> None:
+        if self.state.status == COMMITTED:
+            return
+        if self.state.status is None:
+            raise Reservation.CommitAborted(
+                FailedPrecondition(),
+                message="Reservation is missing",
+            )
+
+        # The order may have been paid for after the reservation expired
+        # (and was released); committing re-checks each line's stock,
+        # so this only fails if the stock has really gone since.
+        await asyncio.gather(
+            *(
+                Inventory.ref(line.product_id).commit(
+                    context,
+                    reservation_id=self.ref().state_id,
+                    quantity=line.quantity,
+                ) for line in self.state.lines or []
+            )
+        )
+
+        self.state.status = COMMITTED
+
+    async def release(
+        self,
+        context: TransactionContext,
+        request: ReleaseReservationRequest,
+    ) -> None:
+        if self.state.status != RESERVED:
+            return
+
+        await asyncio.gather(
+            *(
+                Inventory.ref(line.product_id).release(
+                    context,
+                    reservation_id=self.ref().state_id,
+                ) for line in self.state.lines or []
+            )
+        )
+
+        self.state.status = RELEASED
@@ -0,0 +1,145 @@
+"""Measures how the latency of cart mutations grows with cart size.
+
+Boots the application from `main.py` on a local Reboot runtime, fills a
+cart of each size, then times `CartServicer`'s Writers on it end to end,
+i.e., including loading and storing the cart's state. Run with:
+
+    PYTHONPATH=api python -m bench.cart_mutations
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable
+from reboot.aio.external import ExternalContext
+from store.v1.store import CartOp
+from store.v1.store_rbt import Cart
+from backend.src.catalog_loader import load_products
+from bench.harness import percentile, running_application
+from bench.load_test import synthetic_products
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_ITERATIONS = 200
+
+# How many lines are added per `apply_cart_ops` call when filling a cart.
+FILL_BATCH_SIZE = 500
+
+
+def _product_id(index: int) -> str:
+    # The ids of `synthetic_products`.
+    return f"bench-{index:07d}"
+
+
+async def _fill_cart(
+    context: ExternalContext,
+    cart: Cart.WeakReference,
+    size: int,
+) -> None:
+    for start in range(0, size, FILL_BATCH_SIZE):
+        await cart.apply_cart_ops(
+            context,
+            ops=[
+                CartOp(kind="add", product_id=_product_id(index), quantity=1)
+                for index in range(start, min(start + FILL_BATCH_SIZE, size))
+            ],
+        )
+
+
+async def _latencies_ms(
+    mutate: Callable[[int], Awaitable[None]],
+    iterations: int,
+) -> list[float]:
+    """Returns the sorted latencies of `iterations` calls to `mutate`,
+    which is passed the index of the call.
+    """
+    latencies = []
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        await mutate(iteration)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return latencies
+
+
+async def _bench_cart(
+    context: ExternalContext,
+    size: int,
+    iterations: int,
+) -> dict:
+    cart = Cart.ref(f"bench-cart-{size}")
+    await _fill_cart(context, cart, size)
+
+    # Mutations target the line in the middle of the cart, which is
+    # where a linear scan would spend half its time on average.
+    product_id = _product_id(size // 2)
+
+    async def update(iteration: int) -> None:
+        await cart.update_item_quantity(
+            context,
+            product_id=product_id,
+            quantity=iteration + 1,
+        )
+
+    async def remove_and_add(iteration: int) -> None:
+        # The line is added back (reading the catalog) so that the cart
+        # stays the same size.
+        await cart.remove_item(context, product_id=product_id)
+        await cart.add_item(context, product_id=product_id, quantity=1)
+
+    async def add(iteration: int) -> None:
+        # The line is already in the cart, so this only bumps its
+        # quantity, without reading the catalog.
+        await cart.add_item(context, product_id=product_id, quantity=1)
+
+    results: dict = {"cart_size": size}
+    for name, mutate in (
+        ("update_item_quantity", update),
+        ("add_item", add),
+        ("remove_and_add_item", remove_and_add),
+    ):
+        latencies = await _latencies_ms(mutate, iterations)
+        results[f"{name}_p50_ms"] = percentile(latencies, 0.5)
+        results[f"{name}_p99_ms"] = percentile(latencies, 0.99)
+    return results
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    async with running_application() as rbt:
+        context = rbt.create_external_context(
+            name="bench",
+            app_internal=True,
+        )
+
+        products = max(args.sizes)
+        await load_products(
+            context,
+            synthetic_products(products),
+            idempotency_prefix=f"bench-{products}",
+        )
+
+        return [
+            await _bench_cart(context, size, args.iterations)
+            for size in args.sizes
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+    )
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=DEFAULT_ITERATIONS,
+    )
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from reboot.aio.tests import Reboot
+from main import create_application
+
+
+@dataclass(kw_only=True)
+class ScenarioResult:
+    name: str
+    concurrency: int
+    requests: int
+    errors: int
+    seconds: float
+    requests_per_second: float
+    p50_ms: float
+    p99_ms: float
+    # Resident memory of this process and the application's servers
+    # once the scenario has finished.
+    rss_mb: float
+    # How the scenario was measured, where that isn't obvious.
+    note: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Returns the nearest-rank percentile of `sorted_values`."""
+    if len(sorted_values) == 0:
+        return 0.0
+    index = min(
+        len(sorted_values) - 1,
+        max(0, round(fraction * len(sorted_values)) - 1),
+    )
+    return sorted_values[index]
+
+
+def rss_bytes() -> int:
+    """Returns the resident memory of this process and its children.
+
+    Reads `/proc`, so this is only supported on Linux; elsewhere it
+    returns 0.
+    """
+    total = 0
+    pids = [os.getpid()] + [
+        child.pid for child in multiprocessing.active_children()
+    ]
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+    return total
+
+
+async def run_scenario(
+    name: str,
+    call: Callable[[int, int], Awaitable[None]],
+    *,
+    concurrency: int,
+    requests: int,
+    note: Optional[str] = None,
+) -> ScenarioResult:
+    """Makes `requests` calls to `call` from `concurrency` workers.
+
+    `call` is passed the index of the worker and of the request; a call
+    that raises counts as an error.
+    """
+    latencies: list[float] = []
+    errors = 0
+    next_request = 0
+
+    async def worker(worker_index: int) -> None:
+        nonlocal errors, next_request
+        while next_request < requests:
+            request_index = next_request
+            next_request += 1
+            start = time.perf_counter()
+            try:
+                await call(worker_index, request_index)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    async with asyncio.TaskGroup() as tasks:
+        for worker_index in range(concurrency):
+            tasks.create_task(worker(worker_index))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    return ScenarioResult(
+        name=name,
+        concurrency=concurrency,
+        requests=requests,
+        errors=errors,
+        seconds=seconds,
+        requests_per_second=requests / seconds if seconds > 0 else 0.0,
+        p50_ms=percentile(latencies, 0.5) * 1000,
+        p99_ms=percentile(latencies, 0.99) * 1000,
+        rss_mb=rss_bytes() / (1024 * 1024),
+        note=note,
+    )
+
+
+@asynccontextmanager
+async def running_application() -> AsyncIterator[Reboot]:
+    """Boots the application from `main.py` on a local Reboot runtime,
+    including its `/mcp` endpoint, and tears it down afterwards.
+    """
+    rbt = Reboot()
+    await rbt.start()
+    try:
+        await rbt.up(create_application(), local_envoy=True)
+        yield rbt
+    finally:
+        await rbt.stop()
@@ -0,0 +1,417 @@
+"""Load tests the MCP tools and servicers against a local Reboot runtime.
+
+Boots the application from `main.py`, loads a synthetic catalog, seeds
+users with large carts and order histories, then drives each scenario
+at the given concurrency. Run with:
+
+    PYTHONPATH=api python -m bench.load_test --products 1000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import uuid7
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Iterator
+from reboot.aio.external import ExternalContext
+from reboot.mcp.client import connect
+from store.v1.store import (
+    Address,
+    CartItem,
+    CartOp,
+    Order,
+    Product,
+    ReservationLine,
+)
+from store.v1.store_rbt import Cart, Orders, ProductCatalog, Reservation
+from backend.src.catalog_loader import load_products
+from backend.src.fake_providers import running_fake_providers
+from backend.src.order import PAID
+from constants import PRODUCT_CATALOG_ID
+from bench.harness import ScenarioResult, run_scenario, running_application
+
+CATEGORIES = ["shirts", "pants", "shoes", "accessories", "men", "women"]
+WORDS = ["classic", "blue", "black", "running", "leather", "cotton", "slim"]
+
+SCENARIOS = [
+    "show_products",
+    "add_item_to_cart",
+    "checkout",
+    "Orders.checkout",
+    "Cart.get_items",
+    "ProductCatalog.list_products",
+    "Orders.get_orders",
+]
+
+# Scenarios whose MCP tools all act on the same user's cart, so that
+# concurrent calls would check out (and empty) each other's carts; these
+# are run one call at a time.
+SERIAL_SCENARIOS = {"checkout"}
+
+# How scenarios whose measurements need explaining are measured; these
+# are included in the results.
+SCENARIO_NOTES = {
+    "checkout":
+        "Measured serially (concurrency 1) through /mcp on the single "
+        "MCP user's cart, refilled with one item before each checkout; "
+        "see Orders.checkout for concurrent checkouts of large carts.",
+    "Orders.checkout":
+        "Each worker checks out its own bench user's cart by calling "
+        "the servicers that checkout calls, without the shipping and "
+        "payment providers; every call first refills the cart with "
+        "--cart-size lines.",
+}
+
+ADDRESS = Address(
+    street_address="1 Main St",
+    city="Springfield",
+    state="CA",
+    country="US",
+    zip_code="94000",
+)
+
+CHECKOUT_ARGUMENTS = {
+    "card_number": "4242424242424242",
+    "card_cvv": 123,
+    "card_expiration_month": 12,
+    "card_expiration_year": 2030,
+    "shipping_street_address": "1 Main St",
+    "shipping_city": "Springfield",
+    "shipping_state": "CA",
+    "shipping_country": "US",
+    "shipping_zip_code": "94000",
+}
+
+
+def synthetic_products(count: int) -> Iterator[Product]:
+    """Yields `count` deterministic products with plenty of stock."""
+    rng = random.Random(count)
+    for index in range(count):
+        words = rng.sample(WORDS, 2)
+        yield Product(
+            id=f"bench-{index:07d}",
+            name=" ".join(words).title() + f" {index}",
+            description=f"A {' '.join(words)} product for benchmarking",
+            picture="",
+            price_cents=rng.randint(500, 20000),
+            categories=rng.sample(CATEGORIES, 2),
+            stock_quantity=1_000_000,
+        )
+
+
+def bench_user(index: int) -> str:
+    return f"bench-user-{index}"
+
+
+def cart_product_ids(
+    user_index: int,
+    *,
+    products: int,
+    cart_size: int,
+) -> list[str]:
+    """Returns the products in a bench user's cart."""
+    return [
+        f"bench-{(user_index * cart_size + line) % products:07d}"
+        for line in range(cart_size)
+    ]
+
+
+async def seed_users(
+    context: ExternalContext,
+    *,
+    users: int,
+    products: int,
+    cart_size: int,
+    order_history: int,
+) -> None:
+    """Gives each bench user a cart of `cart_size` lines and
+    `order_history` past orders.
+    """
+
+    async def seed_user(user_index: int) -> None:
+        user_id = bench_user(user_index)
+        product_ids = cart_product_ids(
+            user_index,
+            products=products,
+            cart_size=cart_size,
+        )
+
+        await Cart.ref(user_id).apply_cart_ops(
+            context,
+            ops=[
+                CartOp(kind="add", product_id=product_id, quantity=1)
+                for product_id in product_ids
+            ],
+        )
+
+        items = [
+            CartItem(
+                product_id=product_id,
+                quantity=1,
+                name=product_id,
+                price_cents=1000,
+                picture="",
+            ) for product_id in product_ids[:10]
+        ]
+        for order_index in range(order_history):
+            # One order an hour, ending now.
+            created_at = datetime.now(timezone.utc) - timedelta(
+                hours=order_history - order_index
+            )
+            await Orders.ref(user_id).add_order(
+                context,
+                order=Order(
+                    order_id=str(uuid7.create(created_at)),
+                    items=items,
+                    transaction_id=f"txn_{order_index}",
+                    subtotal_cents=10000,
+                    shipping_cost_cents=500,
+                    total_cents=10500,
+                    tracking_number=f"TRACK{order_index}",
+                    carrier="Mock Shipping Co.",
+                    created_at_time=int(created_at.timestamp() * 1000),
+                    shipping_address=ADDRESS,
+                ),
+            )
+
+    async with asyncio.TaskGroup() as tasks:
+        for user_index in range(users):
+            tasks.create_task(seed_user(user_index))
+
+
+async def run(args: argparse.Namespace) -> list[ScenarioResult]:
+    if not args.fake_providers:
+        return await _run(args)
+
+    # Checkout calls the providers over pooled HTTP connections, as it
+    # would real ones.
+    async with running_fake_providers(
+        latency_ms=args.provider_latency_ms,
+    ) as url:
+        os.environ["SHIPPING_PROVIDER_URL"] = url
+        os.environ["PAYMENT_PROVIDER_URL"] = url
+        return await _run(args)
+
+
+async def _run(args: argparse.Namespace) -> list[ScenarioResult]:
+    async with running_application() as rbt:
+        context = rbt.create_external_context(
+            name="bench",
+            app_internal=True,
+        )
+
+        load_stats = await load_products(
+            context,
+            synthetic_products(args.products),
+            idempotency_prefix=f"bench-{args.products}",
+        )
+        logging.info(
+            "Loaded %d products in %.1fs",
+            load_stats.products,
+            load_stats.seconds,
+        )
+
+        # Every worker checks out a user of its own.
+        users = max(args.users, args.concurrency)
+
+        await seed_users(
+            context,
+            users=users,
+            products=args.products,
+            cart_size=args.cart_size,
+            order_history=args.order_history,
+        )
+
+        catalog = ProductCatalog.ref(PRODUCT_CATALOG_ID)
+
+        async with AsyncExitStack() as stack:
+            # One MCP session per worker, like one agent per user.
+            sessions = [
+                (
+                    await stack.enter_async_context(
+                        connect(rbt.url("/mcp"))
+                    )
+                )[0] for _ in range(args.concurrency)
+            ]
+
+            async def call_tool(worker: int, name: str, arguments: dict):
+                result = await sessions[worker].call_tool(name, arguments)
+                if result.isError:
+                    raise RuntimeError(f"`{name}` failed: {result.content}")
+
+            async def show_products(worker: int, request: int) -> None:
+                await call_tool(
+                    worker,
+                    "show_products",
+                    {"search_query": random.choice(WORDS)},
+                )
+
+            async def add_item_to_cart(worker: int, request: int) -> None:
+                await call_tool(
+                    worker,
+                    "add_item_to_cart",
+                    {
+                        "product_id": f"bench-{request % args.products:07d}",
+                        "quantity": 1,
+                    },
+                )
+
+            async def checkout(worker: int, request: int) -> None:
+                # Checking out empties the cart, so fill it again first.
+                await add_item_to_cart(worker, request)
+                await call_tool(worker, "checkout", CHECKOUT_ARGUMENTS)
+
+            async def servicer_checkout(worker: int, request: int) -> None:
+                user_id = bench_user(worker)
+                cart = Cart.ref(user_id)
+
+                await cart.apply_cart_ops(
+                    context,
+                    ops=[
+                        CartOp(kind="add", product_id=product_id, quantity=1)
+                        for product_id in cart_product_ids(
+                            worker,
+                            products=args.products,
+                            cart_size=args.cart_size,
+                        )
+                    ],
+                )
+
+                items = list((await cart.refresh_prices(context)).items)
+
+                created_at = datetime.now(timezone.utc)
+                order_id = str(uuid7.create(created_at))
+                reservation = Reservation.ref(order_id)
+                await reservation.reserve(
+                    context,
+                    lines=[
+                        ReservationLine(
+                            product_id=item.product_id,
+                            quantity=item.quantity,
+                        ) for item in items
+                    ],
+                )
+                await reservation.commit(context)
+
+                subtotal_cents = sum(
+                    item.price_cents * item.quantity for item in items
+                )
+                await Orders.ref(user_id).add_order(
+                    context,
+                    order=Order(
+                        order_id=order_id,
+                        items=items,
+                        transaction_id=f"txn_{request}",
+                        subtotal_cents=subtotal_cents,
+                        shipping_cost_cents=500,
+                        total_cents=subtotal_cents + 500,
+                        tracking_number="",
+                        carrier="Mock Shipping Co.",
+                        created_at_time=int(created_at.timestamp() * 1000),
+                        shipping_address=ADDRESS,
+                        status=PAID,
+                    ),
+                )
+
+                await cart.empty_cart(context)
+
+            async def get_items(worker: int, request: int) -> None:
+                await Cart.ref(bench_user(request % users)).get_items(
+                    context
+                )
+
+            async def list_products(worker: int, request: int) -> None:
+                await catalog.list_products(context)
+
+            async def get_orders(worker: int, request: int) -> None:
+                await Orders.ref(bench_user(request % users)
+                                ).get_orders(context)
+
+            calls: dict[str, Callable[[int, int], Awaitable[None]]] = {
+                "show_products": show_products,
+                "add_item_to_cart": add_item_to_cart,
+                "checkout": checkout,
+                "Orders.checkout": servicer_checkout,
+                "Cart.get_items": get_items,
+                "ProductCatalog.list_products": list_products,
+                "Orders.get_orders": get_orders,
+            }
+
+            results = []
+            for name in args.scenarios:
+                result = await run_scenario(
+                    name,
+                    calls[name],
+                    concurrency=(
+                        1 if name in SERIAL_SCENARIOS else args.concurrency
+                    ),
+                    requests=args.requests,
+                    note=SCENARIO_NOTES.get(name),
+                )
+                logging.info(
+                    "%s: %.0f req/s, p50 %.1fms, p99 %.1fms, %d errors",
+                    name,
+                    result.requests_per_second,
+                    result.p50_ms,
+                    result.p99_ms,
+                    result.errors,
+                )
+                results.append(result)
+
+            return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--cart-size", type=int, default=200)
+    parser.add_argument("--order-history", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=SCENARIOS,
+        default=SCENARIOS,
+    )
+    parser.add_argument(
+        "--fake-providers",
+        action="store_true",
+        help="Check out against local fake HTTP providers, not mocks.",
+    )
+    parser.add_argument("--provider-latency-ms", type=float, default=0.0)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="Where to write the JSON results (default: stdout).",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+
+    results = asyncio.run(run(args))
+
+    output = json.dumps(
+        {
+            "products": args.products,
+            "users": max(args.users, args.concurrency),
+            "cart_size": args.cart_size,
+            "order_history": args.order_history,
+            "scenarios": [result.as_dict() for result in results],
+        },
+        indent=2,
+    )
+    if args.output is not None:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Measures how much storing orders compactly saves.
+
+Compares orders stored in full, as they used to be, against the
+`StoredOrder`s that `OrdersServicer` stores now: the bytes each takes in
+the orders map, and how long decoding a history takes (for compact
+orders including hydrating them from the catalog's products). Run with:
+
+    PYTHONPATH=api python -m bench.order_storage
+"""
+import argparse
+import json
+import time
+from store.v1.store import Address, CartItem, Order, Product
+from reboot.protobuf import from_model
+from backend.src.order import (
+    address_id,
+    compact_order,
+    decode_order,
+    hydrate_order,
+)
+
+DEFAULT_ORDERS = 1000
+DEFAULT_ITEMS_PER_ORDER = 5
+DEFAULT_PRODUCTS = 200
+DEFAULT_ADDRESSES = 3
+
+
+def _product(index: int) -> Product:
+    return Product(
+        id=f"product-{index:05d}",
+        name=f"Classic Cotton Crew Neck T-Shirt, Style {index}",
+        description="",
+        picture=(
+            "https://images.example.com/catalog/products/apparel/tops/"
+            f"product-{index:05d}/front-view-high-resolution.png"
+        ),
+        price_cents=1000 + index,
+        categories=[],
+        stock_quantity=100,
+    )
+
+
+def _address(index: int) -> Address:
+    return Address(
+        street_address=f"{100 + index} Long Example Boulevard, Apt {index}",
+        city="San Francisco",
+        state="California",
+        country="United States",
+        zip_code="94107",
+    )
+
+
+def _orders(
+    count: int,
+    items_per_order: int,
+    products: list[Product],
+    addresses: list[Address],
+) -> list[Order]:
+    orders = []
+    for index in range(count):
+        items = [
+            CartItem(
+                product_id=product.id,
+                quantity=1,
+                name=product.name,
+                price_cents=product.price_cents,
+                picture=product.picture,
+            ) for product in (
+                products[(index + offset) % len(products)]
+                for offset in range(items_per_order)
+            )
+        ]
+        subtotal_cents = sum(item.price_cents for item in items)
+        orders.append(
+            Order(
+                order_id=f"order-{index:07d}",
+                items=items,
+                transaction_id=f"txn_{index:012d}",
+                subtotal_cents=subtotal_cents,
+                shipping_cost_cents=599,
+                total_cents=subtotal_cents + 599,
+                tracking_number=f"TRACK{index:010d}",
+                carrier="UPS",
+                created_at_time=1_700_000_000_000 + index,
+                shipping_address=addresses[index % len(addresses)],
+            )
+        )
+    return orders
+
+
+def _bytes(values) -> int:
+    return sum(len(value.SerializeToString()) for value in values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=DEFAULT_ORDERS)
+    parser.add_argument(
+        "--items-per-order",
+        type=int,
+        default=DEFAULT_ITEMS_PER_ORDER,
+    )
+    parser.add_argument("--products", type=int, default=DEFAULT_PRODUCTS)
+    parser.add_argument("--addresses", type=int, default=DEFAULT_ADDRESSES)
+    args = parser.parse_args()
+
+    products = [_product(index) for index in range(args.products)]
+    addresses = [_address(index) for index in range(args.addresses)]
+    orders = _orders(args.orders, args.items_per_order, products, addresses)
+
+    full_values = [from_model(order) for order in orders]
+    compact_values = [from_model(compact_order(order)) for order in orders]
+    address_book = {address_id(address): address for address in addresses}
+
+    start = time.perf_counter()
+    for value in full_values:
+        decode_order(value)
+    full_decode_seconds = time.perf_counter() - start
+
+    # Hydration is handed the products it needs, as `get_products`
+    # returns them in one call per page; the call itself isn't timed.
+    products_by_id = {product.id: product for product in products}
+    start = time.perf_counter()
+    for value in compact_values:
+        hydrate_order(decode_order(value), products_by_id, address_book)
+    compact_decode_seconds = time.perf_counter() - start
+
+    print(
+        json.dumps(
+            {
+                "orders": args.orders,
+                "items_per_order": args.items_per_order,
+                "full_bytes": _bytes(full_values),
+                "compact_bytes":
+                    _bytes(compact_values) +
+                    _bytes(from_model(address) for address in addresses),
+                "full_decode_ms": full_decode_seconds * 1000,
+                "compact_decode_ms": compact_decode_seconds * 1000,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,14 @@
 # PRODUCT_CATALOG_ID should be the same as in web/constants.ts.
 PRODUCT_CATALOG_ID = "product-catalog"
-ORDERS_ID = "orders"
+PRODUCT_SEARCH_INDEX_ID = "product-search-index"
+# Keyed by category and price; the original "product-category-index",
+# keyed by category and product id, is no longer read.
+PRODUCT_CATEGORY_INDEX_ID = "product-category-index-by-price"
+PRODUCT_CHANGE_LOG_ID = "product-change-log"
+
+# Before orders were stored per user every `Orders` shared this single
+# `OrderedMap`; it is only still read to migrate existing orders.
+LEGACY_ORDERS_ID = "orders"
 
 # Shortcut to circumvent Auth in this example. Otherwise this would be available
 # on `context` after user login.
@@ -1,18 +1,31 @@
 import asyncio
 import os
-import random
 import time
 import urllib.parse
+import uuid7
+from typing import Optional
 from mcp_ui_server import create_ui_resource
 from mcp_ui_server.core import UIResource
+from starlette.responses import PlainTextResponse
+from reboot.aio.applications import Application
 from reboot.aio.external import InitializeContext
-from reboot.aio.workflows import at_least_once
 from reboot.mcp.server import DurableMCP, DurableContext
 from backend.src.cart import CartServicer
 from backend.src.product import ProductCatalogServicer
-from backend.src.order import OrdersServicer
-from store.v1.store import Product, CartItem, Order, Address
-from store.v1.store_rbt import ProductCatalog, Cart, Orders
+from backend.src.order import OUT_OF_STOCK, PAID, OrdersServicer
+from backend.src.inventory import InventoryServicer
+from backend.src.reservation import ReservationServicer
+from backend.src.catalog_loader import load_products
+from backend.src import instrumentation, metrics, providers
+from store.v1.store import (
+    Product,
+    Order,
+    Address,
+    CartOp,
+    RefreshPricesResponse,
+    ReservationLine,
+)
+from store.v1.store_rbt import Cart, Orders, ProductCatalog, Reservation
 from constants import PRODUCT_CATALOG_ID, USER_ID
 from rbt.v1alpha1.errors_pb2 import Aborted
 from reboot.std.collections.ordered_map.v1 import ordered_map
@@ -21,6 +34,7 @@ mcp = DurableMCP(path="/mcp")
 
 
 @mcp.tool()
+@instrumentation.tool
 def show_products(
     search_query: str,
     context: DurableContext,
@@ -57,6 +71,44 @@ def show_products(
 
 
 @mcp.tool()
+@instrumentation.tool
+def show_products_in_category(
+    category: str,
+    context: DurableContext,
+    min_price_cents: Optional[int] = None,
+    max_price_cents: Optional[int] = None,
+) -> list[UIResource]:
+    """Display the products in a category (e.g., 'shoes', 'shirts') in
+    an interactive UI, optionally limited to a price range.
+
+    Args:
+        category: The category to browse.
+        min_price_cents: Only show products costing at least this much.
+        max_price_cents: Only show products costing at most this much.
+    """
+    params = {"category": category}
+    if min_price_cents is not None:
+        params["min_price_cents"] = str(min_price_cents)
+    if max_price_cents is not None:
+        params["max_price_cents"] = str(max_price_cents)
+    encoded_params = urllib.parse.urlencode(params)
+
+    ui_resource = create_ui_resource(
+        {
+            "uri": f"ui://products/category/{encoded_params}",
+            "content": {
+                "type": "externalUrl",
+                "iframeUrl":
+                    f"http://localhost:3000/products?{encoded_params}"
+            },
+            "encoding": "text"
+        }
+    )
+    return [ui_resource]
+
+
+@mcp.tool()
+@instrumentation.tool
 def show_cart(context: DurableContext) -> list[UIResource]:
     """Display the shopping cart in an interactive UI."""
     iframe_url = f"http://localhost:3000/cart?cart_id={USER_ID}"
@@ -75,6 +127,7 @@ def show_cart(context: DurableContext) -> list[UIResource]:
 
 
 @mcp.tool()
+@instrumentation.tool
 def show_orders(context: DurableContext) -> list[UIResource]:
     """Display past orders in an interactive UI."""
     iframe_url = f"http://localhost:3000/orders?orders_id={USER_ID}"
@@ -93,6 +146,20 @@ def show_orders(context: DurableContext) -> list[UIResource]:
 
 
 @mcp.tool()
+@instrumentation.tool
+async def get_order_summary(context: DurableContext) -> dict:
+    """Summarize the user's order history: how many orders they have
+    placed and how much they have spent, in total and per month.
+
+    Amounts are in cents, months are "YYYY-MM" and times are
+    milliseconds since the epoch.
+    """
+    response = await Orders.ref(USER_ID).get_order_summary(context)
+    return response.summary.model_dump()
+
+
+@mcp.tool()
+@instrumentation.tool
 async def add_item_to_cart(
     product_id: str, quantity: int, context: DurableContext
 ) -> list[UIResource]:
@@ -104,23 +171,57 @@ async def add_item_to_cart(
     """
     cart_id = USER_ID
 
-    get_product_response = await ProductCatalog.ref(
-        PRODUCT_CATALOG_ID
-    ).get_product(
+    # The cart looks the product up in the catalog itself (and only if
+    # it isn't already in the cart), so we don't read it here too.
+    await Cart.ref(cart_id).add_item(
         context,
         product_id=product_id,
+        quantity=quantity,
     )
-    product = get_product_response.product
 
-    await Cart.ref(cart_id).add_item(
+    iframe_url = f"http://localhost:3000/cart?cart_id={cart_id}"
+
+    ui_resource = create_ui_resource(
+        {
+            "uri": f"ui://cart",
+            "content": {
+                "type": "externalUrl",
+                "iframeUrl": iframe_url
+            },
+            "encoding": "text"
+        }
+    )
+    return [ui_resource]
+
+
+@mcp.tool()
+@instrumentation.tool
+async def add_items_to_cart(
+    product_ids: list[str],
+    context: DurableContext,
+    quantities: Optional[list[int]] = None,
+) -> list[UIResource]:
+    """Add several items to the shopping cart at once.
+
+    Args:
+        product_ids: The IDs of the products to add.
+        quantities: The quantity to add of each product, in the same
+        order as `product_ids` (default: 1 of each).
+    """
+    cart_id = USER_ID
+
+    if quantities is None:
+        quantities = [1] * len(product_ids)
+    elif len(quantities) != len(product_ids):
+        raise ValueError("Expected one quantity per product id")
+
+    # All of the items are added in a single write to the cart.
+    await Cart.ref(cart_id).apply_cart_ops(
         context,
-        item=CartItem(
-            product_id=product_id,
-            quantity=quantity,
-            name=product.name,
-            price_cents=product.price_cents,
-            picture=product.picture,
-        ),
+        ops=[
+            CartOp(kind="add", product_id=product_id, quantity=quantity)
+            for product_id, quantity in zip(product_ids, quantities)
+        ],
     )
 
     iframe_url = f"http://localhost:3000/cart?cart_id={cart_id}"
@@ -138,43 +239,123 @@ async def add_item_to_cart(
     return [ui_resource]
 
 
-# Mock functions for checkout workflow.
+checkout_seconds = metrics.histogram(
+    "checkout_seconds",
+    "How long `checkout` takes, from reading the cart to scheduling "
+    "fulfillment.",
+)
+checkout_step_seconds = metrics.histogram(
+    "checkout_step_seconds",
+    "How long each step of `checkout` takes, by step.",
+)
+checkout_refunds = metrics.counter(
+    "checkout_refunds_total",
+    "Number of checkouts refunded because their stock was gone by the "
+    "time they were paid for.",
+)
+
+
+def _price_drift(refreshed: RefreshPricesResponse) -> Optional[str]:
+    """Describes how the cart changed when its prices were refreshed, or
+    returns `None` if nothing changed.
+    """
+    changes = [
+        f"{change.product_id} changed from {change.old_price_cents} to "
+        f"{change.new_price_cents} cents"
+        for change in refreshed.price_changes
+    ] + [
+        f"{product_id} is no longer available"
+        for product_id in refreshed.removed_ids
+    ]
+    if len(changes) == 0:
+        return None
+    return (
+        "Your cart changed since items were added: " + "; ".join(changes) +
+        ". The cart has been updated; check out again to pay the new total."
+    )
+
+
+async def _timed_step(step: str, alias: str, context, callable, *, type):
+    """Runs `callable` as the durable step `alias`, recording how long it
+    takes under `step` in `checkout_step_seconds`.
+    """
+    with checkout_step_seconds.time(step=step):
+        return await instrumentation.at_least_once(
+            alias,
+            context,
+            callable,
+            type=type,
+        )
+
+
+# Checkout's calls to the shipping and payment providers; these are
+# mocks unless configured otherwise (see `backend/src/providers.py`).
 async def get_shipping_quote(items: list, address: dict) -> dict:
-    """Mock function to get shipping quote."""
-    # In real implementation, this would call a shipping API.
-    total_weight = len(items) * 2  # Mock weight calculation.
-    base_cost = 500  # $5.00 base.
-    weight_cost = total_weight * 50  # $0.50 per pound.
-    total_cost = base_cost + weight_cost
-
-    return {
-        "cost_cents": total_cost,
-        "carrier": "Mock Shipping Co.",
-        "estimated_days": random.randint(3, 7),
-    }
+    return await providers.quote_shipping(items, address)
 
 
 async def charge_credit_card(card_info: dict, amount_cents: int) -> dict:
-    """Mock function to charge credit card (non-idempotent)."""
-    # In real implementation, this would call a payment processor.
-    return {
-        "transaction_id": f"txn_{random.randint(100000, 999999)}",
-        "last_four": card_info.get("number", "0000")[-4:],
-        "amount_cents": amount_cents,
-    }
+    """Charges the card (non-idempotent)."""
+    return await providers.payment().charge(card_info, amount_cents)
 
 
-async def ship_order(items: list, address: dict, carrier: str) -> dict:
-    """Mock function to ship order (non-idempotent)."""
-    # In real implementation, this would call a shipping API.
-    return {
-        "tracking_number": f"TRACK{random.randint(1000000000, 9999999999)}",
-        "carrier": carrier,
-        "status": "shipped",
-    }
+async def refund_payment(transaction_id: str, amount_cents: int) -> dict:
+    """Refunds a charge (non-idempotent)."""
+    return await providers.payment().refund(transaction_id, amount_cents)
 
 
 @mcp.tool()
+@instrumentation.tool
+async def get_checkout_status(order_id: str, context: DurableContext) -> dict:
+    """Get the status of an order placed with `checkout`: "paid" while it
+    is being prepared for shipping, then "shipped" with its tracking
+    number; or "out_of_stock" if it was paid for but can't be shipped.
+
+    Args:
+        order_id: The ID of the order.
+    """
+    response = await Orders.ref(USER_ID).get_order_status(
+        context,
+        order_id=order_id,
+    )
+    return response.model_dump()
+
+
+@mcp.tool()
+@instrumentation.tool
+async def quote_shipping(
+    shipping_street_address: str,
+    shipping_city: str,
+    shipping_state: str,
+    shipping_country: str,
+    shipping_zip_code: str,
+    context: DurableContext,
+) -> dict:
+    """Preview the cost of shipping the items in the cart, without
+    checking out.
+
+    Args:
+        shipping_street_address: Shipping street address
+        shipping_city: Shipping city
+        shipping_state: Shipping state
+        shipping_country: Shipping country
+        shipping_zip_code: Shipping zip code
+    """
+    cart_response = await Cart.ref(USER_ID).get_items(context)
+    return await get_shipping_quote(
+        list(cart_response.items),
+        {
+            "street_address": shipping_street_address,
+            "city": shipping_city,
+            "state": shipping_state,
+            "country": shipping_country,
+            "zip_code": shipping_zip_code,
+        },
+    )
+
+
+@mcp.tool()
+@instrumentation.tool
 async def checkout(
     card_number: str,
     card_cvv: int,
@@ -189,6 +370,10 @@ async def checkout(
 ) -> list[UIResource]:
     """Complete the checkout process for items in the cart.
 
+    If any prices changed since the items were added, the cart is updated
+    and checkout fails without charging, so the new total can be
+    confirmed before checking out again.
+
     Args:
         card_number: Credit card number
         card_cvv: Credit card CVV
@@ -203,8 +388,38 @@ async def checkout(
     cart_id = USER_ID
     orders_id = USER_ID
 
-    cart_response = await Cart.ref(cart_id).get_items(context)
-    items = list(cart_response.items)
+    # The steps of checkout form a dependency graph; steps that don't
+    # depend on each other run concurrently, so checkout takes as long
+    # as its critical path: cart read -> quote (alongside reserving the
+    # stock) -> charge -> commit the stock. Shipping is done afterwards
+    # by `Orders.fulfill`.
+    async def read_cart() -> list:
+        # Revalidate every item against the catalog, in a single round
+        # trip, so that we never charge for stale prices.
+        with checkout_step_seconds.time(step="refresh_prices"):
+            refreshed = await Cart.ref(cart_id).refresh_prices(context)
+        drift = _price_drift(refreshed)
+        if drift is not None:
+            raise Cart.RefreshPricesAborted(Aborted(), message=drift)
+        return list(refreshed.items)
+
+    async def generate_order_id() -> str:
+        # UUIDv7s sort by creation time, which keeps each user's orders
+        # in chronological order.
+        return str(uuid7.create())
+
+    checkout_start = time.perf_counter()
+
+    items, order_id = await asyncio.gather(
+        read_cart(),
+        _timed_step(
+            "generate_order_id",
+            "Generate order ID",
+            context,
+            generate_order_id,
+            type=str,
+        ),
+    )
 
     if len(items) == 0:
         raise Cart.GetItemsAborted(Aborted(), message="Cart is empty.")
@@ -220,13 +435,34 @@ async def checkout(
     }
 
     async def get_quote():
+        # Quotes are cached per address and weight, so a retried checkout
+        # (or one previewed with `quote_shipping`) rarely calls the
+        # provider here; the step still pins the quote that was charged.
         return await get_shipping_quote(items, address)
 
-    shipping_quote = await at_least_once(
-        "Get shipping quote",
-        context,
-        get_quote,
-        type=dict,
+    async def reserve_stock() -> None:
+        # All of the cart's lines are held in a single transaction, so
+        # we never charge for an order that can't be fulfilled.
+        with checkout_step_seconds.time(step="reserve_stock"):
+            await Reservation.ref(order_id).reserve(
+                context,
+                lines=[
+                    ReservationLine(
+                        product_id=item.product_id,
+                        quantity=item.quantity,
+                    ) for item in items
+                ],
+            )
+
+    shipping_quote, _ = await asyncio.gather(
+        _timed_step(
+            "get_shipping_quote",
+            "Get shipping quote",
+            context,
+            get_quote,
+            type=dict,
+        ),
+        reserve_stock(),
     )
 
     total_cents = subtotal_cents + shipping_quote["cost_cents"]
@@ -242,39 +478,62 @@ async def checkout(
             total_cents,
         )
 
-    charge_result = await at_least_once(
-        "Charge credit card",
-        context,
-        charge_card,
-        type=dict,
-    )
+    try:
+        charge_result = await _timed_step(
+            "charge_credit_card",
+            "Charge credit card",
+            context,
+            charge_card,
+            type=dict,
+        )
+    except Exception:
+        # Don't keep the stock from other buyers while the user sorts
+        # out their payment.
+        await Reservation.ref(order_id).release(context)
+        raise
 
     # Simulate failure for testing retry logic.
     # To simulate failure set the environment variable FAIL_CHECKOUT=anything.
     if os.environ.get("FAIL_CHECKOUT"):
         await asyncio.Event().wait()
 
-
-    async def ship() -> dict:
-        return await ship_order(items, address, shipping_quote["carrier"])
-
-    shipping_result = await at_least_once(
-        "Ship order",
-        context,
-        ship,
-        type=dict,
-    )
-
-    async def generate_order_id() -> str:
-        return f"order_{random.randint(100000, 999999)}"
-
-    order_id = await at_least_once(
-        "Generate order ID",
-        context,
-        generate_order_id,
-        type=str,
+    # Commit the stock now that it's paid for, before the reservation
+    # can expire. Even if it has, this only fails if the stock has been
+    # taken since, in which case the payment is refunded and the order
+    # is recorded but never shipped.
+    status = PAID
+    try:
+        with checkout_step_seconds.time(step="commit_stock"):
+            await Reservation.ref(order_id).commit(context)
+    except Reservation.CommitAborted:
+        status = OUT_OF_STOCK
+
+    if status == OUT_OF_STOCK:
+
+        async def refund() -> dict:
+            return await refund_payment(
+                charge_result["transaction_id"],
+                total_cents,
+            )
+
+        await _timed_step(
+            "refund_payment",
+            "Refund payment",
+            context,
+            refund,
+            type=dict,
+        )
+        checkout_refunds.inc()
+
+    shipping_address = Address(
+        street_address=shipping_street_address,
+        city=shipping_city,
+        state=shipping_state,
+        country=shipping_country,
+        zip_code=shipping_zip_code,
     )
 
+    # A paid order gets its tracking number once it has shipped.
     order = Order(
         order_id=order_id,
         items=items,
@@ -282,28 +541,48 @@ async def checkout(
         subtotal_cents=subtotal_cents,
         shipping_cost_cents=shipping_quote["cost_cents"],
         total_cents=total_cents,
-        tracking_number=shipping_result["tracking_number"],
-        carrier=shipping_result["carrier"],
-        created_at_time=int(time.time() * 1000),
-        shipping_address=Address(
-            street_address=shipping_street_address,
-            city=shipping_city,
-            state=shipping_state,
-            country=shipping_country,
-            zip_code=shipping_zip_code,
-        ),
+        tracking_number="",
+        carrier=shipping_quote["carrier"],
+        created_at_time=int(uuid7.time(order_id).timestamp() * 1000),
+        shipping_address=shipping_address,
+        status=status,
     )
 
-    await Orders.ref(orders_id).add_order(context, order=order)
-
-    await Cart.ref(cart_id).empty_cart(context)
-
-    encoded_order = urllib.parse.quote(
-        f"{order_id}|{charge_result}|{subtotal_cents}|"
-        f"{shipping_quote['cost_cents']}|{total_cents}|{shipping_result}"
+    # The cart is only emptied once the order has been recorded, so that
+    # a retried checkout never finds an empty cart for an unrecorded
+    # order. Both are quick local writes, and emptying the cart before
+    # returning keeps the agent from checking the same cart out twice.
+    with checkout_step_seconds.time(step="add_order"):
+        await Orders.ref(orders_id).add_order(context, order=order)
+
+    with checkout_step_seconds.time(step="empty_cart"):
+        await Cart.ref(cart_id).empty_cart(context)
+
+    # Shipping happens in the background, so the agent only waits for
+    # the payment.
+    if status == PAID:
+        with checkout_step_seconds.time(step="schedule_fulfillment"):
+            await Orders.ref(orders_id).idempotently(
+                "Fulfill order"
+            ).schedule().fulfill(
+                context,
+                order_id=order_id,
+                items=items,
+                shipping_address=shipping_address,
+                carrier=shipping_quote["carrier"],
+            )
+
+    checkout_seconds.observe(time.perf_counter() - checkout_start)
+
+    # The page looks the order up by id, so neither this response nor
+    # the URL carry any of the order (or payment) details.
+    params = urllib.parse.urlencode(
+        {
+            "orders_id": orders_id,
+            "order_id": order_id,
+        }
     )
-
-    iframe_url = f"http://localhost:3000/order?data={encoded_order}"
+    iframe_url = f"http://localhost:3000/order?{params}"
 
     ui_resource = create_ui_resource(
         {
@@ -555,24 +834,83 @@ async def initialize(context: InitializeContext):
         ),
     ]
 
+    await load_products(
+        context,
+        products,
+        idempotency_prefix="initialize-add-products",
+    )
+
+    # Index the whole catalog once, e.g., products stored before there
+    # was a search index. Bump the version whenever the indexes' layout
+    # changes (as it did when the category index was ordered by price),
+    # so that they're built again.
     catalog = ProductCatalog.ref(PRODUCT_CATALOG_ID)
 
-    for product in products:
-        await catalog.idempotently(f"add-product-{product.id}").add_product(
-            context,
-            product=product,
-        )
+    batch = 0
+    start_key = None
+    while True:
+        response = await catalog.idempotently(
+            f"reindex-products-v2-{batch}"
+        ).reindex_products(context, start_key=start_key)
+        if response.next_cursor is None:
+            break
+        start_key = response.next_cursor
+        batch += 1
+
+    # Products stored before stock was tracked by `Inventory` have none
+    # there, so they would look out of stock; seed it from the catalog.
+    batch = 0
+    start_key = None
+    while True:
+        response = await catalog.idempotently(
+            f"seed-inventory-{batch}"
+        ).seed_inventory(context, start_key=start_key)
+        if response.next_cursor is None:
+            break
+        start_key = response.next_cursor
+        batch += 1
+
+    # Orders used to be stored in a single map shared by all users; move
+    # any that are still there into the (only) user's own map.
+    orders = Orders.ref(USER_ID)
+
+    batch = 0
+    while True:
+        response = await orders.idempotently(
+            f"migrate-legacy-orders-{batch}"
+        ).migrate_legacy_orders(context)
+        if response.done:
+            break
+        batch += 1
+
+
+async def metrics_endpoint() -> PlainTextResponse:
+    """Serves this process' metrics in the Prometheus text format."""
+    return PlainTextResponse(
+        metrics.render(),
+        media_type="text/plain; version=0.0.4",
+    )
 
 
-async def main():
-    await mcp.application(
+def create_application() -> Application:
+    application = mcp.application(
         servicers=[
             CartServicer,
             ProductCatalogServicer,
             OrdersServicer,
+            InventoryServicer,
+            ReservationServicer,
         ] + ordered_map.servicers(),
         initialize=initialize,
-    ).run()
+    )
+
+    application.http.get("/metrics")(metrics_endpoint)
+
+    return application
+
+
+async def main():
+    await create_application().run()
 
 
 if __name__ == '__main__':
@@ -1,3 +1,2 @@
 // PRODUCT_CATALOG_ID should be the same as in constants.py.
 export const PRODUCT_CATALOG_ID = "product-catalog";
-export const ORDERS_ID = "orders";
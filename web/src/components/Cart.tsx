@@ -1,18 +1,86 @@
+import { useEffect, useRef, useState } from "react";
 import { useSearchParams } from "react-router-dom";
 import { useCart } from "../../api/store/v1/store_rbt_react";
 import { formatPrice, sendPromptToParent } from "../utils";
 
+// How long to wait after the last click before writing the changes.
+const FLUSH_DELAY_MS = 400;
+
+type PendingChange = { kind: "update"; quantity: number } | { kind: "remove" };
+
 const Cart = () => {
   const [searchParams] = useSearchParams();
   const id = searchParams.get("cart_id");
+
+  // Clicks are collected here and written to the cart together, in a
+  // single `applyCartOps` call, once the user pauses.
+  const [pending, setPending] = useState<Map<string, PendingChange>>(
+    new Map()
+  );
+  const flushTimer = useRef<ReturnType<typeof setTimeout>>();
+  const [flushFailed, setFlushFailed] = useState(false);
+
+  const { useGetItems, applyCartOps } = useCart({ id: id ?? "" });
+  const { response } = useGetItems();
+
+  useEffect(() => {
+    if (pending.size === 0) return;
+
+    clearTimeout(flushTimer.current);
+    flushTimer.current = setTimeout(async () => {
+      const changes = [...pending.entries()];
+      const { aborted } = await applyCartOps({
+        ops: changes.map(([productId, change]) =>
+          change.kind === "update"
+            ? { kind: "update", productId, quantity: change.quantity }
+            : { kind: "remove", productId }
+        ),
+      });
+
+      // Keep the changes pending, so that they are still shown and are
+      // written again with the next click, rather than telling the
+      // parent about changes that didn't happen.
+      if (aborted !== undefined) {
+        setFlushFailed(true);
+        return;
+      }
+      setFlushFailed(false);
+
+      // Keep anything clicked while the write was in flight.
+      setPending((current) => {
+        const next = new Map(current);
+        for (const [productId, change] of changes) {
+          if (next.get(productId) === change) next.delete(productId);
+        }
+        return next;
+      });
+
+      sendPromptToParent(
+        changes
+          .map(([productId, change]) =>
+            change.kind === "update"
+              ? `The quantity of product ${productId} has been updated to ` +
+                `${change.quantity} in my cart.`
+              : `Product ${productId} has been removed from my cart.`
+          )
+          .join(" ")
+      );
+    }, FLUSH_DELAY_MS);
+
+    return () => clearTimeout(flushTimer.current);
+  }, [pending]);
+
   if (id === null) {
     return <>Error: cart_id required in query params.</>;
   }
 
-  const { useGetItems, removeItem, updateItemQuantity } = useCart({ id });
-  const { response } = useGetItems();
-
-  const items = response?.items ?? [];
+  // Show pending changes right away rather than after they're written.
+  const items = (response?.items ?? []).flatMap((item) => {
+    const change = pending.get(item.productId ?? "");
+    if (change === undefined) return [item];
+    if (change.kind === "remove") return [];
+    return [{ ...item, quantity: change.quantity }];
+  });
 
   const calculateTotal = () => {
     return (
@@ -25,18 +93,18 @@ const Cart = () => {
   };
 
   const updateQuantity = (productId: string, newQuantity: number) => {
-    updateItemQuantity({ productId, quantity: newQuantity });
-
-    sendPromptToParent(
-      `The quantity of product ${productId} has been updated to ${newQuantity} 
-      in my cart.`
+    setPending((pending) =>
+      new Map(pending).set(productId, {
+        kind: "update",
+        quantity: newQuantity,
+      })
     );
   };
 
   const removeCartItem = (productId: string) => {
-    removeItem({ productId });
-
-    sendPromptToParent(`Product ${productId} has been removed from my cart.`);
+    setPending((pending) =>
+      new Map(pending).set(productId, { kind: "remove" })
+    );
   };
 
   const checkout = () => {
@@ -63,6 +131,12 @@ const Cart = () => {
       <div className="max-w-2xl mx-auto">
         <h1 className="text-sm font-bold text-gray-900 mb-2">Shopping Cart</h1>
 
+        {flushFailed && (
+          <div className="mb-2 p-2 bg-red-50 rounded text-xs text-red-800">
+            Your cart couldn't be updated. Please try again.
+          </div>
+        )}
+
         <div className="bg-white rounded shadow-sm">
           <div className="divide-y divide-gray-200">
             {items.map((item) => (
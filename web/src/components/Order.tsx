@@ -1,32 +1,37 @@
 import { useSearchParams } from "react-router-dom";
+import { useOrders } from "../../api/store/v1/store_rbt_react";
 import { formatPrice } from "../utils";
 
+const NotFound = () => (
+  <div className="min-h-screen flex items-center justify-center bg-gray-50">
+    <div className="text-center">
+      <h2 className="text-sm font-bold text-gray-800 mb-1">
+        No order found
+      </h2>
+    </div>
+  </div>
+);
+
 const Order = () => {
   const [searchParams] = useSearchParams();
-  const data = searchParams.get("data");
+  const ordersId = searchParams.get("orders_id");
+  const orderId = searchParams.get("order_id");
 
-  if (!data) {
-    return (
-      <div className="min-h-screen flex items-center justify-center bg-gray-50">
-        <div className="text-center">
-          <h2 className="text-sm font-bold text-gray-800 mb-1">
-            No order found
-          </h2>
-        </div>
-      </div>
-    );
+  // The order is read by id, and updates by itself once it has shipped.
+  const { useGetOrder } = useOrders({ id: ordersId ?? "" });
+  const { response, aborted } = useGetOrder({ orderId: orderId ?? "" });
+
+  if (ordersId === null || orderId === null || aborted !== undefined) {
+    return <NotFound />;
+  }
+
+  if (response === undefined) {
+    return <div className="text-xs text-gray-600 p-2">Loading...</div>;
   }
 
-  // Format:
-  // orderId|lastFour|subtotalCents|shippingCents|totalCents|trackingNumber
-  const [
-    orderId,
-    lastFour,
-    subtotalCents,
-    shippingCents,
-    totalCents,
-    trackingNumber,
-  ] = data.split("|");
+  const order = response.order;
+  const outOfStock = order.status === "out_of_stock";
+  const shipped = order.status !== "paid" && !outOfStock;
 
   return (
     <div className="min-h-screen bg-gray-50 p-2">
@@ -37,51 +42,83 @@ const Order = () => {
             <h1 className="text-lg font-bold text-gray-900 mb-1">
               Order Confirmed!
             </h1>
-            <p className="text-xs text-gray-600">Order #{orderId}</p>
+            <p className="text-xs text-gray-600">Order #{order.orderId}</p>
+          </div>
+
+          <div className="space-y-1 text-sm">
+            {(order.items ?? []).map((item) => (
+              <div key={item.productId} className="flex justify-between">
+                <span className="text-gray-900">
+                  {item.name ?? "Unknown"} × {String(item.quantity ?? 0)}
+                </span>
+                <span className="text-gray-900">
+                  {formatPrice(
+                    item.priceCents && item.quantity
+                      ? item.priceCents * item.quantity
+                      : undefined
+                  )}
+                </span>
+              </div>
+            ))}
           </div>
 
           <div className="border-t border-b border-gray-200 py-3 my-3">
             <div className="flex justify-between text-sm mb-2">
               <span className="text-gray-600">Subtotal:</span>
               <span className="text-gray-900">
-                {formatPrice(Number(subtotalCents))}
+                {formatPrice(order.subtotalCents)}
               </span>
             </div>
             <div className="flex justify-between text-sm mb-2">
               <span className="text-gray-600">Shipping:</span>
               <span className="text-gray-900">
-                {formatPrice(Number(shippingCents))}
+                {formatPrice(order.shippingCostCents)}
               </span>
             </div>
             <div className="flex justify-between text-base font-bold">
               <span className="text-gray-900">Total:</span>
               <span className="text-gray-900">
-                {formatPrice(Number(totalCents))}
+                {formatPrice(order.totalCents)}
               </span>
             </div>
           </div>
 
           <div className="space-y-2 text-sm">
             <div>
-              <span className="text-gray-600">Payment Method:</span>
-              <span className="ml-2 text-gray-900">
-                •••• •••• •••• {lastFour}
-              </span>
+              <span className="text-gray-600">Carrier:</span>
+              <span className="ml-2 text-gray-900">{order.carrier}</span>
             </div>
             <div>
               <span className="text-gray-600">Tracking Number:</span>
               <span className="ml-2 text-gray-900 font-mono text-xs">
-                {trackingNumber}
+                {shipped
+                  ? order.trackingNumber
+                  : outOfStock
+                  ? "Not shipping"
+                  : "Preparing shipment"}
               </span>
             </div>
           </div>
 
-          <div className="mt-4 p-3 bg-blue-50 rounded">
-            <p className="text-xs text-blue-800">
-              Your order has been confirmed and will be shipped soon. You'll
-              receive a shipping notification once your package is on its way.
-            </p>
-          </div>
+          {outOfStock ? (
+            <div className="mt-4 p-3 bg-red-50 rounded">
+              <p className="text-xs text-red-800">
+                Some of your items sold out before your order could be
+                completed, so it won't be shipped. Your payment has been
+                refunded.
+              </p>
+            </div>
+          ) : (
+            <div className="mt-4 p-3 bg-blue-50 rounded">
+              <p className="text-xs text-blue-800">
+                {shipped
+                  ? "Your order is on its way."
+                  : "Your order has been confirmed and will be shipped " +
+                    "soon. This page will show its tracking number once " +
+                    "it has."}
+              </p>
+            </div>
+          )}
         </div>
       </div>
     </div>
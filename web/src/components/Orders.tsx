@@ -1,157 +1,276 @@
+import { useEffect, useState } from "react";
 import { useSearchParams } from "react-router-dom";
 import { useOrders } from "../../api/store/v1/store_rbt_react";
 import { formatPrice } from "../utils";
 
+const PAGE_SIZE = 10;
+
+type GetRecentOrdersResponse = NonNullable<
+  ReturnType<ReturnType<typeof useOrders>["useGetRecentOrders"]>["response"]
+>;
+
+type OrderType = GetRecentOrdersResponse["orders"][number];
+
+const formatDate = (timestamp?: number) => {
+  if (!timestamp) return "N/A";
+  // `createdAtTime` is in milliseconds since the epoch.
+  return new Date(Number(timestamp)).toLocaleDateString("en-US", {
+    year: "numeric",
+    month: "long",
+    day: "numeric",
+    hour: "2-digit",
+    minute: "2-digit",
+  });
+};
+
+// A single page of the order history, newest first, fetched as its own
+// reactive query.
+const OrdersPage = ({
+  id,
+  cursor,
+  onPageLoaded,
+}: {
+  id: string;
+  cursor?: string;
+  onPageLoaded: (count: number, nextCursor: string | undefined) => void;
+}) => {
+  const { useGetRecentOrders } = useOrders({ id });
+  const { response } = useGetRecentOrders({ cursor, limit: PAGE_SIZE });
+
+  const count = response?.orders.length;
+  const nextCursor = response?.nextCursor;
+
+  useEffect(() => {
+    if (count !== undefined) onPageLoaded(count, nextCursor);
+  }, [count, nextCursor, onPageLoaded]);
+
+  if (response === undefined) return null;
+
+  return (
+    <>
+      {response.orders.map((order) => (
+        <OrderCard key={order.orderId} order={order} />
+      ))}
+    </>
+  );
+};
+
+// Totals over the whole history, kept up to date by the backend as
+// orders are placed, so they don't need every page to be fetched.
+const OrderSummary = ({ id }: { id: string }) => {
+  const { useGetOrderSummary } = useOrders({ id });
+  const { response } = useGetOrderSummary();
+
+  if (response === undefined) return null;
+
+  const count = Number(response.summary.orderCount ?? 0);
+
+  return (
+    <p className="text-sm text-gray-600 -mt-4 mb-6">
+      {count} {count === 1 ? "order" : "orders"},{" "}
+      {formatPrice(response.summary.totalCents)} spent
+    </p>
+  );
+};
+
 const Orders = () => {
   const [searchParams] = useSearchParams();
   const id = searchParams.get("orders_id");
+
+  // The cursor of every page fetched so far; `undefined` is the first
+  // (most recent) page.
+  const [cursors, setCursors] = useState<(string | undefined)[]>([
+    undefined,
+  ]);
+  const [pages, setPages] = useState<
+    Record<number, { count: number; nextCursor?: string }>
+  >({});
+
   if (id === null) {
     return <>Error: orders_id required in query params.</>;
   }
 
-  const { useGetOrders } = useOrders({ id });
-  const { response } = useGetOrders();
+  const lastPage = cursors.length - 1;
+  const loaded = lastPage in pages;
+  const nextCursor = pages[lastPage]?.nextCursor;
 
-  const orders = response?.orders ?? [];
-
-  const formatDate = (timestamp?: number) => {
-    if (!timestamp) return "N/A";
-    return new Date(Number(timestamp) * 1000).toLocaleDateString("en-US", {
-      year: "numeric",
-      month: "long",
-      day: "numeric",
-      hour: "2-digit",
-      minute: "2-digit",
-    });
+  const loadMore = () => {
+    if (nextCursor !== undefined) setCursors([...cursors, nextCursor]);
   };
 
-  if (orders.length === 0) {
-    return (
-      <div className="min-h-screen flex items-center justify-center bg-gray-50">
-        <div className="text-center">
-          <div className="text-4xl mb-2">📦</div>
-          <h2 className="text-lg font-semibold text-gray-800 mb-2">
-            No orders yet
-          </h2>
-          <p className="text-sm text-gray-600">
-            Your order history will appear here
-          </p>
-        </div>
-      </div>
-    );
-  }
+  const onPageLoaded =
+    (page: number) => (count: number, nextCursor: string | undefined) =>
+      setPages((pages) =>
+        pages[page]?.count === count && pages[page]?.nextCursor === nextCursor
+          ? pages
+          : { ...pages, [page]: { count, nextCursor } }
+      );
+
+  const empty = loaded && lastPage === 0 && pages[0].count === 0;
 
   return (
     <div className="min-h-screen bg-gray-50 p-4">
       <div className="max-w-4xl mx-auto">
-        <h1 className="text-2xl font-bold text-gray-900 mb-6">Order History</h1>
+        {empty ? (
+          <div className="min-h-screen flex items-center justify-center">
+            <div className="text-center">
+              <div className="text-4xl mb-2">📦</div>
+              <h2 className="text-lg font-semibold text-gray-800 mb-2">
+                No orders yet
+              </h2>
+              <p className="text-sm text-gray-600">
+                Your order history will appear here
+              </p>
+            </div>
+          </div>
+        ) : (
+          <>
+            <h1 className="text-2xl font-bold text-gray-900 mb-6">
+              Order History
+            </h1>
+            <OrderSummary id={id} />
+          </>
+        )}
 
         <div className="space-y-4">
-          {orders.map((order) => (
-            <div key={order.orderId} className="bg-white rounded shadow-sm p-4">
-              <div className="flex justify-between items-start mb-4">
-                <div>
-                  <h2 className="text-lg font-semibold text-gray-900">
-                    Order #{order.orderId}
-                  </h2>
-                  <p className="text-sm text-gray-600">
-                    {formatDate(order.createdAtTime)}
-                  </p>
-                </div>
-                <div className="text-right">
-                  <p className="text-lg font-bold text-gray-900">
-                    {formatPrice(order.totalCents)}
-                  </p>
-                </div>
-              </div>
-
-              <div className="mb-4">
-                <h3 className="text-sm font-semibold text-gray-700 mb-2">
-                  Items:
-                </h3>
-                <div className="space-y-2">
-                  {(order.items ?? []).map((item) => (
-                    <div
-                      key={item.productId}
-                      className="flex items-center gap-3"
-                    >
-                      <img
-                        src={item.picture ?? ""}
-                        alt={item.name ?? "Product"}
-                        className="w-12 h-12 object-cover rounded"
-                      />
-                      <div className="flex-1">
-                        <p className="text-sm font-medium text-gray-900">
-                          {item.name ?? "Unknown"}
-                        </p>
-                        <p className="text-xs text-gray-600">
-                          Quantity: {String(item.quantity ?? 0)}
-                        </p>
-                      </div>
-                      <p className="text-sm font-semibold text-gray-900">
-                        {formatPrice(
-                          item.priceCents && item.quantity
-                            ? item.priceCents * item.quantity
-                            : undefined
-                        )}
-                      </p>
-                    </div>
-                  ))}
-                </div>
-              </div>
-
-              <div className="border-t border-gray-200 pt-3 space-y-1 text-sm">
-                <div className="flex justify-between">
-                  <span className="text-gray-600">Subtotal:</span>
-                  <span className="text-gray-900">
-                    {formatPrice(order.subtotalCents)}
-                  </span>
-                </div>
-                <div className="flex justify-between">
-                  <span className="text-gray-600">Shipping:</span>
-                  <span className="text-gray-900">
-                    {formatPrice(order.shippingCostCents)}
-                  </span>
-                </div>
-                <div className="flex justify-between font-semibold text-base">
-                  <span className="text-gray-900">Total:</span>
-                  <span className="text-gray-900">
-                    {formatPrice(order.totalCents)}
-                  </span>
-                </div>
-              </div>
-
-              <div
-                className="mt-4 pt-3 border-t border-gray-200 text-sm 
-                          space-y-1"
-              >
-                <div>
-                  <span className="text-gray-600">Tracking Number: </span>
-                  <span className="text-gray-900 font-mono text-xs">
-                    {order.trackingNumber}
-                  </span>
-                </div>
-                <div>
-                  <span className="text-gray-600">Carrier: </span>
-                  <span className="text-gray-900">{order.carrier}</span>
-                </div>
-                <div>
-                  <span className="text-gray-600">Shipping Address: </span>
-                  <span className="text-gray-900">
-                    {order.shippingAddress?.streetAddress},{" "}
-                    {order.shippingAddress?.city},{" "}
-                    {order.shippingAddress?.state}{" "}
-                    {order.shippingAddress?.zipCode},{" "}
-                    {order.shippingAddress?.country}
-                  </span>
-                </div>
-              </div>
-            </div>
+          {cursors.map((cursor, page) => (
+            <OrdersPage
+              key={cursor ?? ""}
+              id={id}
+              cursor={cursor}
+              onPageLoaded={onPageLoaded(page)}
+            />
           ))}
         </div>
+
+        {!loaded && <div className="text-sm text-gray-600">Loading...</div>}
+
+        {loaded && nextCursor !== undefined && (
+          <div className="mt-4 text-center">
+            <button
+              onClick={loadMore}
+              className="bg-white hover:bg-gray-100 text-gray-900 px-3 py-1.5
+                        rounded shadow-sm text-sm font-medium"
+            >
+              Load more
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
 };
 
+const OrderCard = ({ order }: { order: OrderType }) => (
+  <div className="bg-white rounded shadow-sm p-4">
+    <div className="flex justify-between items-start mb-4">
+      <div>
+        <h2 className="text-lg font-semibold text-gray-900">
+          Order #{order.orderId}
+        </h2>
+        <p className="text-sm text-gray-600">
+          {formatDate(order.createdAtTime)}
+        </p>
+      </div>
+      <div className="text-right">
+        <p className="text-lg font-bold text-gray-900">
+          {formatPrice(order.totalCents)}
+        </p>
+      </div>
+    </div>
+
+    <div className="mb-4">
+      <h3 className="text-sm font-semibold text-gray-700 mb-2">
+        Items:
+      </h3>
+      <div className="space-y-2">
+        {(order.items ?? []).map((item) => (
+          <div
+            key={item.productId}
+            className="flex items-center gap-3"
+          >
+            <img
+              src={item.picture ?? ""}
+              alt={item.name ?? "Product"}
+              className="w-12 h-12 object-cover rounded"
+            />
+            <div className="flex-1">
+              <p className="text-sm font-medium text-gray-900">
+                {item.name ?? "Unknown"}
+              </p>
+              <p className="text-xs text-gray-600">
+                Quantity: {String(item.quantity ?? 0)}
+              </p>
+            </div>
+            <p className="text-sm font-semibold text-gray-900">
+              {formatPrice(
+                item.priceCents && item.quantity
+                  ? item.priceCents * item.quantity
+                  : undefined
+              )}
+            </p>
+          </div>
+        ))}
+      </div>
+    </div>
+
+    <div className="border-t border-gray-200 pt-3 space-y-1 text-sm">
+      <div className="flex justify-between">
+        <span className="text-gray-600">Subtotal:</span>
+        <span className="text-gray-900">
+          {formatPrice(order.subtotalCents)}
+        </span>
+      </div>
+      <div className="flex justify-between">
+        <span className="text-gray-600">Shipping:</span>
+        <span className="text-gray-900">
+          {formatPrice(order.shippingCostCents)}
+        </span>
+      </div>
+      <div className="flex justify-between font-semibold text-base">
+        <span className="text-gray-900">Total:</span>
+        <span className="text-gray-900">
+          {formatPrice(order.totalCents)}
+        </span>
+      </div>
+    </div>
+
+    <div
+      className="mt-4 pt-3 border-t border-gray-200 text-sm 
+                space-y-1"
+    >
+      <div>
+        <span className="text-gray-600">Tracking Number: </span>
+        {/* Paid orders ship in the background; this page updates by
+            itself once they have. */}
+        {order.status === "paid" ? (
+          <span className="text-gray-600 text-xs">Preparing shipment</span>
+        ) : order.status === "out_of_stock" ? (
+          <span className="text-red-600 text-xs">
+            Not shipping: out of stock
+          </span>
+        ) : (
+          <span className="text-gray-900 font-mono text-xs">
+            {order.trackingNumber}
+          </span>
+        )}
+      </div>
+      <div>
+        <span className="text-gray-600">Carrier: </span>
+        <span className="text-gray-900">{order.carrier}</span>
+      </div>
+      <div>
+        <span className="text-gray-600">Shipping Address: </span>
+        <span className="text-gray-900">
+          {order.shippingAddress?.streetAddress},{" "}
+          {order.shippingAddress?.city},{" "}
+          {order.shippingAddress?.state}{" "}
+          {order.shippingAddress?.zipCode},{" "}
+          {order.shippingAddress?.country}
+        </span>
+      </div>
+    </div>
+  </div>
+);
+
 export default Orders;
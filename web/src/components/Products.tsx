@@ -1,39 +1,332 @@
+import { useCallback, useEffect, useMemo, useState } from "react";
 import { useSearchParams } from "react-router-dom";
-import { useProductCatalog } from "../../api/store/v1/store_rbt_react";
+import {
+  useInventory,
+  useProductCatalog,
+} from "../../api/store/v1/store_rbt_react";
 import { PRODUCT_CATALOG_ID } from "../../constants";
 import { formatPrice, sendPromptToParent } from "../utils";
 
-const Products = () => {
-  const [searchParams] = useSearchParams();
-  const query = searchParams.get("query") || undefined;
+const PAGE_SIZE = 24;
+
+type ListProductsResponse = NonNullable<
+  ReturnType<
+    ReturnType<typeof useProductCatalog>["useListProducts"]
+  >["response"]
+>;
 
+type ProductType = ListProductsResponse["products"][number];
+
+// Grid cards only need a summary of a product; the rest is shown when
+// it happens to have been fetched anyway.
+type CardProduct = Pick<ProductType, "id" | "name" | "priceCents" | "picture"> &
+  Partial<Pick<ProductType, "description">>;
+
+// A single page of the catalog. Each page is its own reactive query, so
+// only the pages the user has asked for are ever fetched.
+const ProductsPage = ({
+  startKey,
+  changes,
+  onNextCursor,
+  onVersion,
+}: {
+  startKey?: string;
+  changes: ProductChanges;
+  onNextCursor: (cursor: string | undefined) => void;
+  onVersion: (version: number) => void;
+}) => {
   const { useListProducts } = useProductCatalog({ id: PRODUCT_CATALOG_ID });
-  const { response } = useListProducts();
-
-  if (response === undefined) return <>Loading...</>;
-  const products = response.products;
-
-  const filteredProducts = query
-    ? products.filter((p) => {
-        const queryTerms = query.toLowerCase().split(/\s+/);
-        return queryTerms.some(
-          (term) =>
-            (p.name?.toLowerCase().includes(term) ?? false) ||
-            (p.description?.toLowerCase().includes(term) ?? false) ||
-            (p.categories ?? []).some((cat: string) =>
-              cat.toLowerCase().includes(term)
-            )
-        );
-      })
-    : products;
-
-  const addToCart = (product: (typeof products)[number]) => {
-    sendPromptToParent(
-      `Add one ${product.name} to my cart (product ID: ${product.id})`
-    );
+  const { response } = useListProducts({
+    startKey,
+    pageSize: PAGE_SIZE,
+    view: "summary",
+  });
+
+  const version = response?.version;
+  useEffect(() => {
+    if (version !== undefined) onVersion(Number(version));
+  }, [version, onVersion]);
+
+  return (
+    <ProductCards
+      products={response && (response.summaries ?? [])}
+      changes={changes}
+      nextCursor={response?.nextCursor}
+      onNextCursor={onNextCursor}
+    />
+  );
+};
+
+// Changes to products since `version`, keyed by product id; `null`
+// means the product was removed.
+type ProductChanges = Map<string, CardProduct | null>;
+
+// Follows the catalog's change log from `version` on, so that pages that
+// were read at `version` can apply just what changed instead of being
+// read again.
+const ProductChangesSince = ({
+  version,
+  onChanges,
+  onResync,
+}: {
+  version: number;
+  onChanges: (changes: ProductChanges) => void;
+  // Called if the changes since `version` are no longer all logged.
+  onResync: () => void;
+}) => {
+  const { useGetChangesSince } = useProductCatalog({ id: PRODUCT_CATALOG_ID });
+  const { response } = useGetChangesSince({ version, limit: 1000 });
+
+  const resyncRequired = response?.resyncRequired ?? false;
+  useEffect(() => {
+    if (resyncRequired) onResync();
+  }, [resyncRequired, onResync]);
+
+  const changes = useMemo(() => {
+    const changes: ProductChanges = new Map();
+    for (const change of response?.changes ?? []) {
+      changes.set(
+        change.productId ?? "",
+        change.kind === "remove" ? null : change.product ?? null
+      );
+    }
+    return changes;
+  }, [response]);
+
+  useEffect(() => onChanges(changes), [changes, onChanges]);
+
+  return null;
+};
+
+type CategoryFilter = {
+  category: string;
+  minPriceCents?: number;
+  maxPriceCents?: number;
+};
+
+// A single page of a category, read from the category index so that it
+// costs the same however large the rest of the catalog is.
+const CategoryPage = ({
+  filter,
+  startKey,
+  onNextCursor,
+}: {
+  filter: CategoryFilter;
+  startKey?: string;
+  onNextCursor: (cursor: string | undefined) => void;
+}) => {
+  const { useListProductsByCategory } = useProductCatalog({
+    id: PRODUCT_CATALOG_ID,
+  });
+  const { response } = useListProductsByCategory({
+    ...filter,
+    startKey,
+    pageSize: PAGE_SIZE,
+  });
+
+  return (
+    <ProductCards
+      products={response?.products}
+      nextCursor={response?.nextCursor}
+      onNextCursor={onNextCursor}
+    />
+  );
+};
+
+const ProductCards = ({
+  products,
+  changes,
+  nextCursor,
+  onNextCursor,
+}: {
+  products?: CardProduct[];
+  changes?: ProductChanges;
+  nextCursor?: string;
+  onNextCursor: (cursor: string | undefined) => void;
+}) => {
+  const loaded = products !== undefined;
+
+  useEffect(() => {
+    if (loaded) onNextCursor(nextCursor);
+  }, [loaded, nextCursor, onNextCursor]);
+
+  if (products === undefined) return null;
+
+  return (
+    <>
+      {products.flatMap((product) => {
+        const changed = changes?.get(product.id ?? "");
+        if (changed === null) return [];
+        return [
+          <ProductCard key={product.id ?? ""} product={changed ?? product} />,
+        ];
+      })}
+    </>
+  );
+};
+
+const AllProducts = ({ filter }: { filter?: CategoryFilter }) => {
+  // The start key of every page fetched so far; `undefined` is the first.
+  const [startKeys, setStartKeys] = useState<(string | undefined)[]>([
+    undefined,
+  ]);
+  const [nextCursors, setNextCursors] = useState<
+    Record<number, string | undefined>
+  >({});
+  // The oldest version any page was read at, and what has changed
+  // since.
+  const [version, setVersion] = useState<number>();
+  const [changes, setChanges] = useState<ProductChanges>(new Map());
+  // Bumped to read every page again from scratch.
+  const [generation, setGeneration] = useState(0);
+  const onResync = useCallback(() => {
+    setStartKeys([undefined]);
+    setNextCursors({});
+    setVersion(undefined);
+    setChanges(new Map());
+    setGeneration((generation) => generation + 1);
+  }, []);
+  const onVersion = useCallback(
+    (pageVersion: number) =>
+      setVersion((version) =>
+        version === undefined ? pageVersion : Math.min(version, pageVersion)
+      ),
+    []
+  );
+
+  const lastPage = startKeys.length - 1;
+  const loaded = lastPage in nextCursors;
+  const nextCursor = nextCursors[lastPage];
+
+  const loadMore = () => {
+    if (nextCursor !== undefined) setStartKeys([...startKeys, nextCursor]);
   };
 
-  if (filteredProducts.length === 0) {
+  return (
+    <div className="min-h-screen bg-gray-50 p-2">
+      <div className="max-w-4xl mx-auto">
+        <div className="grid grid-cols-1 md:grid-cols-2 gap-2">
+          {startKeys.map((startKey, page) => {
+            const onNextCursor = (cursor: string | undefined) =>
+              setNextCursors((cursors) =>
+                page in cursors && cursors[page] === cursor
+                  ? cursors
+                  : { ...cursors, [page]: cursor }
+              );
+            return filter !== undefined ? (
+              <CategoryPage
+                key={`${generation}/${startKey ?? ""}`}
+                filter={filter}
+                startKey={startKey}
+                onNextCursor={onNextCursor}
+              />
+            ) : (
+              <ProductsPage
+                key={`${generation}/${startKey ?? ""}`}
+                startKey={startKey}
+                changes={changes}
+                onNextCursor={onNextCursor}
+                onVersion={onVersion}
+              />
+            );
+          })}
+        </div>
+
+        {version !== undefined && (
+          <ProductChangesSince
+            key={generation}
+            version={version}
+            onChanges={setChanges}
+            onResync={onResync}
+          />
+        )}
+
+        {!loaded && <div className="text-xs text-gray-600">Loading...</div>}
+
+        {loaded && nextCursor !== undefined && (
+          <div className="mt-2 text-center">
+            <button
+              onClick={loadMore}
+              className="bg-white hover:bg-gray-100 text-gray-900 px-3 py-1.5
+                        rounded shadow-sm text-xs font-medium"
+            >
+              Load more
+            </button>
+          </div>
+        )}
+      </div>
+    </div>
+  );
+};
+
+// A single page of search results.
+const SearchPage = ({
+  query,
+  offset,
+  onLoaded,
+}: {
+  query: string;
+  offset: number;
+  onLoaded: (totalHits: number, nextOffset: number | undefined) => void;
+}) => {
+  const { useSearchProducts } = useProductCatalog({ id: PRODUCT_CATALOG_ID });
+  const { response } = useSearchProducts({
+    query,
+    offset,
+    pageSize: PAGE_SIZE,
+  });
+
+  const totalHits =
+    response !== undefined ? Number(response.totalHits ?? 0) : undefined;
+  const nextOffset =
+    response?.nextOffset !== undefined
+      ? Number(response.nextOffset)
+      : undefined;
+
+  useEffect(() => {
+    if (totalHits !== undefined) onLoaded(totalHits, nextOffset);
+  }, [totalHits, nextOffset, onLoaded]);
+
+  if (response === undefined) return null;
+
+  return (
+    <>
+      {response.products.map((product) => (
+        <ProductCard key={product.id ?? ""} product={product} />
+      ))}
+    </>
+  );
+};
+
+// Ranking and filtering happen server side against the search index, so
+// only the matching products are ever sent to the browser, a page at a
+// time.
+const SearchResults = ({ query }: { query: string }) => {
+  // The offset of every page fetched so far.
+  const [offsets, setOffsets] = useState<number[]>([0]);
+  const [pages, setPages] = useState<
+    Record<number, { totalHits: number; nextOffset?: number }>
+  >({});
+
+  const lastPage = offsets.length - 1;
+  const loaded = lastPage in pages;
+  const nextOffset = pages[lastPage]?.nextOffset;
+  const totalHits = pages[0]?.totalHits;
+
+  const loadMore = () => {
+    if (nextOffset !== undefined) setOffsets([...offsets, nextOffset]);
+  };
+
+  const onLoaded =
+    (page: number) => (totalHits: number, nextOffset: number | undefined) =>
+      setPages((pages) =>
+        pages[page]?.totalHits === totalHits &&
+        pages[page]?.nextOffset === nextOffset
+          ? pages
+          : { ...pages, [page]: { totalHits, nextOffset } }
+      );
+
+  if (totalHits === 0) {
     return (
       <div className="min-h-28 flex items-center justify-center bg-gray-50">
         <div className="text-center">
@@ -51,69 +344,129 @@ const Products = () => {
   return (
     <div className="min-h-screen bg-gray-50 p-2">
       <div className="max-w-4xl mx-auto">
-        {query && (
+        {totalHits !== undefined && (
           <div className="mb-2">
             <h1 className="text-sm font-bold text-gray-900">
-              "{query}" - {filteredProducts.length} items
+              "{query}" - {totalHits} items
             </h1>
           </div>
         )}
 
         <div className="grid grid-cols-1 md:grid-cols-2 gap-2">
-          {filteredProducts.map((product) => (
-            <div
-              key={product.id ?? ""}
-              className="bg-white rounded shadow-sm overflow-hidden
-                        hover:shadow-md transition-shadow flex h-32"
-            >
-              <img
-                src={product.picture ?? ""}
-                alt={product.name ?? "Product"}
-                className="w-32 h-full object-cover flex-none"
-              />
-              <div className="p-2 flex-1 flex flex-col justify-between">
-                <div>
-                  <h3
-                    className="text-sm font-semibold text-gray-900 mb-1
-                              line-clamp-1"
-                  >
-                    {product.name ?? "Unknown"}
-                  </h3>
-                  <p className="text-xs text-gray-600 mb-2 line-clamp-2">
-                    {product.description ?? ""}
-                  </p>
-                </div>
-
-                <div className="flex items-end justify-between gap-2">
-                  <div>
-                    <span className="text-sm font-bold text-gray-900">
-                      {formatPrice(product.priceCents)}
-                    </span>
-                    {product.stockQuantity &&
-                      product.stockQuantity > 0n &&
-                      product.stockQuantity < 10n && (
-                        <div className="text-xs text-orange-600">
-                          {String(product.stockQuantity)} left
-                        </div>
-                      )}
-                  </div>
-
-                  <button
-                    onClick={() => addToCart(product)}
-                    className="bg-blue-600 hover:bg-blue-700 text-white px-3
-                              py-1.5 rounded text-xs font-medium
-                              transition-colors whitespace-nowrap"
-                    disabled={product.stockQuantity === 0}
-                  >
-                    {(product.stockQuantity ?? 0n) > 0n
-                      ? "Add to Cart"
-                      : "Out of Stock"}
-                  </button>
-                </div>
-              </div>
-            </div>
+          {offsets.map((offset, page) => (
+            <SearchPage
+              key={offset}
+              query={query}
+              offset={offset}
+              onLoaded={onLoaded(page)}
+            />
           ))}
         </div>
+
+        {!loaded && <div className="text-xs text-gray-600">Loading...</div>}
+
+        {loaded && nextOffset !== undefined && (
+          <div className="mt-2 text-center">
+            <button
+              onClick={loadMore}
+              className="bg-white hover:bg-gray-100 text-gray-900 px-3 py-1.5
+                        rounded shadow-sm text-xs font-medium"
+            >
+              Load more
+            </button>
+          </div>
+        )}
+      </div>
+    </div>
+  );
+};
+
+const Products = () => {
+  const [searchParams] = useSearchParams();
+  const query = searchParams.get("query") || undefined;
+  const category = searchParams.get("category") || undefined;
+
+  // Start over from the first page when the query changes.
+  if (query) return <SearchResults key={query} query={query} />;
+  if (category) {
+    const price = (name: string) => {
+      const value = searchParams.get(name);
+      return value ? Number(value) : undefined;
+    };
+    return (
+      <AllProducts
+        // Start over from the first page when the filter changes.
+        key={searchParams.toString()}
+        filter={{
+          category,
+          minPriceCents: price("min_price_cents"),
+          maxPriceCents: price("max_price_cents"),
+        }}
+      />
+    );
+  }
+  return <AllProducts />;
+};
+
+const ProductCard = ({ product }: { product: CardProduct }) => {
+  // The catalog's stock level doesn't go down as products sell; the
+  // product's inventory does.
+  const { useGetStock } = useInventory({ id: product.id ?? "" });
+  const { response: stock } = useGetStock();
+  const available =
+    stock !== undefined ? Math.max(Number(stock.available ?? 0), 0) : undefined;
+
+  const addToCart = () => {
+    sendPromptToParent(
+      `Add one ${product.name} to my cart (product ID: ${product.id})`
+    );
+  };
+
+  return (
+    <div
+      className="bg-white rounded shadow-sm overflow-hidden
+                hover:shadow-md transition-shadow flex h-32"
+    >
+      <img
+        src={product.picture ?? ""}
+        alt={product.name ?? "Product"}
+        className="w-32 h-full object-cover flex-none"
+      />
+      <div className="p-2 flex-1 flex flex-col justify-between">
+        <div>
+          <h3
+            className="text-sm font-semibold text-gray-900 mb-1
+                      line-clamp-1"
+          >
+            {product.name ?? "Unknown"}
+          </h3>
+          <p className="text-xs text-gray-600 mb-2 line-clamp-2">
+            {product.description ?? ""}
+          </p>
+        </div>
+
+        <div className="flex items-end justify-between gap-2">
+          <div>
+            <span className="text-sm font-bold text-gray-900">
+              {formatPrice(product.priceCents)}
+            </span>
+            {available !== undefined && available > 0 && available < 10 && (
+              <div className="text-xs text-orange-600">{available} left</div>
+            )}
+          </div>
+
+          <button
+            onClick={addToCart}
+            className="bg-blue-600 hover:bg-blue-700 text-white px-3
+                      py-1.5 rounded text-xs font-medium
+                      transition-colors whitespace-nowrap"
+            disabled={available === 0}
+          >
+            {available === undefined || available > 0
+              ? "Add to Cart"
+              : "Out of Stock"}
+          </button>
+        </div>
       </div>
     </div>
   );